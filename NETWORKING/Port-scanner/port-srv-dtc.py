@@ -1,5 +1,11 @@
-import socket
+import asyncio
+import os
+import sys
 import time
+# The scanner engine lives in the top-level Port-scanner directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Port-scanner"))
+from scanner import scan_targets, iter_targets, OPEN
+from banner import with_services, Service
 
 # Common ports dictionary
 common_ports = {
@@ -15,33 +21,23 @@ common_ports = {
     3306: "MySQL"
 }
 
-target = input("Enter target IP: ")
+target = input("Enter target IP (CIDR ranges and several targets separated by spaces work too): ")
 
 print(f"\nScanning target: {target}")
 print("-" * 40)
 
 start_time = time.time()
 
-for port in common_ports.keys():
-    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    s.settimeout(1)
+async def main():
+    results = scan_targets(iter_targets(target.split()), list(common_ports), per_host=len(common_ports))
+    async for item in with_services(results):
+        if isinstance(item, Service):
+            if item.banner:
+                print(f"    {item.host}:{item.port} {item.name}: {item.banner}")
+        elif item.state == OPEN:
+            print(f"[+] {item.host} port {item.port} is OPEN ({common_ports[item.port]})")
 
-    try:
-        s.connect((target, port))
-        print(f"[+] Port {port} is OPEN ({common_ports[port]})")
-
-        try:
-            banner = s.recv(1024).decode().strip()
-            if banner:
-                print(f"    Banner: {banner}")
-        except:
-            pass
-
-    except:
-        pass
-
-    finally:
-        s.close()
+asyncio.run(main())
 
 end_time = time.time()
-print("\nScan completed in", round(end_time - start_time, 2), "seconds")
\ No newline at end of file
+print("\nScan completed in", round(end_time - start_time, 2), "seconds")
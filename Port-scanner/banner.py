@@ -0,0 +1,130 @@
+"""Service detection for open ports.
+
+Connects to each open port, waits briefly for a greeting (SSH, SMTP, FTP,
+MySQL, POP3 and IMAP servers speak first), otherwise sends a protocol probe
+(HTTP HEAD, Redis PING) and names the service from what comes back. Runs as
+a stage on a scan's result stream, grabbing banners while the scan goes on:
+
+    async for item in with_services(scan_targets(hosts, ports)):
+        ...  # scanner Results as they arrive, Services as banners come in
+"""
+import asyncio
+import re
+from collections import namedtuple
+
+from scanner import OPEN
+
+Service = namedtuple("Service", "host port name banner")
+
+# Which protocol to expect on well-known ports
+PORT_HINTS = {
+    21: "ftp", 22: "ssh", 25: "smtp", 80: "http", 110: "pop3", 143: "imap", 465: "smtp", 587: "smtp",
+    2222: "ssh", 3000: "http", 3306: "mysql", 5000: "http", 6379: "redis", 8000: "http", 8008: "http",
+    8080: "http", 8081: "http", 8888: "http",
+}
+
+# Probes for protocols where the client speaks first
+PROBES = {
+    "http": b"HEAD / HTTP/1.0\r\n\r\n",
+    "redis": b"PING\r\n",
+}
+
+def mysql_version(data):
+    # Initial handshake packet: 3-byte length, sequence 0, protocol 10,
+    # NUL-terminated server version
+    if len(data) > 5 and data[3] == 0 and data[4] == 10:
+        return data[5:data.index(b"\0", 5)].decode(errors="replace") if b"\0" in data[5:] else ""
+    if len(data) > 7 and data[3] == 0 and data[4] == 0xFF:  # error packet, e.g. host not allowed
+        return data[7:].decode(errors="replace")
+    return None
+
+def identify(data, hint):
+    """(service name, banner) from a greeting or probe response."""
+    text = data.decode(errors="replace")
+    first = text.split("\r\n")[0].split("\n")[0].strip()
+    if text.startswith("SSH-"):
+        return "ssh", first
+    if text.startswith("HTTP/"):
+        server = re.search(r"^Server:\s*(.+?)\s*$", text, re.IGNORECASE | re.MULTILINE)
+        return "http", server.group(1) if server else first
+    if text.startswith(("+PONG", "-NOAUTH", "-ERR", "-DENIED")):
+        return "redis", first
+    if text.startswith("+OK"):
+        return "pop3", first
+    if text.startswith("* OK"):
+        return "imap", first
+    if text.startswith("220"):
+        if re.search(r"SMTP|Postfix|Exim|Sendmail", first, re.IGNORECASE):
+            return "smtp", first
+        if re.search(r"FTP", first, re.IGNORECASE):
+            return "ftp", first
+        return hint if hint in ("ftp", "smtp") else "ftp/smtp", first
+    version = mysql_version(data)
+    if version is not None:
+        return "mysql", version
+    return hint or "unknown", first
+
+async def read(reader, timeout):
+    try:
+        return await asyncio.wait_for(reader.read(4096), timeout)
+    except (asyncio.TimeoutError, OSError):
+        return b""
+
+async def grab(host, port, timeout=2.0):
+    """Identify the service on an open port within roughly `timeout`."""
+    hint = PORT_HINTS.get(port)
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (asyncio.TimeoutError, OSError):
+        return Service(host, port, hint or "unknown", "")
+    try:
+        data = b""
+        if hint not in PROBES:
+            data = await read(reader, timeout / 2)
+        if not data:
+            writer.write(PROBES.get(hint, PROBES["http"]))
+            data = await read(reader, timeout / 2)
+        return Service(host, port, *identify(data, hint)) if data else Service(host, port, hint or "unknown", "")
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+
+async def with_services(results, concurrency=50, timeout=2.0):
+    """Pass a scan's Results through and add a Service for each open port.
+
+    Open ports are queued to `concurrency` grabber tasks as they arrive, so
+    detection overlaps the rest of the scan; items come out in completion
+    order."""
+    out = asyncio.Queue()
+    opened = asyncio.Queue()
+
+    async def feed():
+        try:
+            async for result in results:
+                out.put_nowait(result)
+                if result.state == OPEN:
+                    opened.put_nowait(result)
+        finally:
+            for _ in range(concurrency):
+                opened.put_nowait(None)
+
+    async def grabber():
+        while (result := await opened.get()) is not None:
+            out.put_nowait(await grab(result.host, result.port, timeout))
+
+    async def run():
+        try:
+            await asyncio.gather(feed(), *(grabber() for _ in range(concurrency)))
+        finally:
+            out.put_nowait(None)
+
+    runner = asyncio.create_task(run())
+    try:
+        while (item := await out.get()) is not None:
+            yield item
+        await runner
+    finally:
+        runner.cancel()
@@ -0,0 +1,80 @@
+"""Memory needed to keep a million probe results, three ways.
+
+    results - a list of scanner Results, i.e. collecting what scan_targets yields
+    dicts   - {host: {port: state}}
+    store   - store.ResultStore (in memory; an mmap'd file costs the same in
+              page cache, but only for hosts actually written)
+
+Measured with tracemalloc on synthetic results: --ports per host, enough
+hosts to make --probes, about 1% open and 10% filtered.
+
+    python bench_store.py --probes 1000000 --ports 1000
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from scanner import Result, OPEN, CLOSED, FILTERED
+from store import ResultStore
+
+def probes(hosts, ports):
+    rng = random.Random(0)
+    for h in range(hosts):
+        host = f"10.{h >> 16 & 255}.{h >> 8 & 255}.{h & 255}"
+        for port in ports:
+            roll = rng.random()
+            yield host, port, OPEN if roll < 0.01 else FILTERED if roll < 0.11 else CLOSED
+
+def measure(build, hosts, ports):
+    # Timed untraced, since tracemalloc slows allocation-heavy builds most
+    start = time.perf_counter()
+    build(probes(hosts, ports))
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    kept = build(probes(hosts, ports))
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return size, elapsed
+
+def results(stream):
+    return [Result(host, port, state, 0.001) for host, port, state in stream]
+
+def dicts(stream):
+    found = {}
+    for host, port, state in stream:
+        found.setdefault(host, {})[port] = state
+    return found
+
+def store(ports):
+    def build(stream):
+        kept = ResultStore(ports)
+        for host, port, state in stream:
+            kept.set(host, port, state)
+        return kept
+    return build
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--probes", type=int, default=1_000_000)
+    parser.add_argument("--ports", type=int, default=1000, help="ports per host (default 1000)")
+    args = parser.parse_args()
+    ports = range(1, args.ports + 1)
+    hosts = max(1, args.probes // args.ports)
+    total = hosts * args.ports
+    print(f"{hosts} hosts x {args.ports} ports = {total} probes\n")
+    print(f"{'':8} {'MiB':>8} {'per 1M':>8} {'bytes/probe':>12} {'build s':>8}")
+    for name, build in (("results", results), ("dicts", dicts), ("store", store(ports))):
+        size, elapsed = measure(build, hosts, ports)
+        print(f"{name:8} {size / 2**20:8.1f} {size / 2**20 * 1e6 / total:8.1f} {size / total:12.2f} {elapsed:8.2f}")
+
+    kept = store(ports)(probes(hosts, ports))
+    start = time.perf_counter()
+    with_22 = kept.hosts_with(22)
+    open_total = kept.count(OPEN)
+    print(f"\nstore: hosts with 22 open ({len(with_22)}) and total open ({open_total}) "
+          f"in {time.perf_counter() - start:.3f}s")
+
+if __name__ == "__main__":
+    main()
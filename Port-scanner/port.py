@@ -1,17 +1,41 @@
 
-import socket
+import asyncio
+import sys
+from scanner import scan_targets, iter_targets, Checkpoint, OPEN
 
-target = input("Enter target IP: ")
+# Scan progress is kept here (and in .hosts next to it) until the scan
+# completes; run with --resume to pick up an interrupted scan
+CHECKPOINT = "port-scan.checkpoint"
+PORTS = range(1, 65536)
 
-print(f"Scanning {target}...\n")
+if "--resume" in sys.argv:
+    checkpoint = Checkpoint(CHECKPOINT, PORTS, resume=True)
+    target = checkpoint.header
+    if target is None:
+        checkpoint.close()
+        checkpoint.discard()
+        sys.exit(f"No scan to resume in {CHECKPOINT}")
+    print(f"Resuming scan of {target}...\n")
+else:
+    target = input("Enter target IP (CIDR ranges and several targets separated by spaces work too): ")
+    checkpoint = Checkpoint(CHECKPOINT, PORTS, header=target)
+    print(f"Scanning {target}...\n")
 
-for port in range(1, 1025):
-    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    s.settimeout(0.5)
+async def main():
+    for result in checkpoint.found:
+        print(f"{result.host} Port {result.port} OPEN")
+    hosts = iter_targets(target.split())
+    async for result in scan_targets(hosts, PORTS, concurrency=1000, per_host=256, timeout=0.5,
+                                     skip=checkpoint):
+        checkpoint.record(result)
+        if result.state == OPEN:
+            print(f"{result.host} Port {result.port} OPEN")
 
-    result = s.connect_ex((target, port))
-
-    if result == 0:
-        print(f"Port {port} OPEN")
-    s.close()
-print('done')
\ No newline at end of file
+try:
+    asyncio.run(main())
+except KeyboardInterrupt:
+    sys.exit("Interrupted; run again with --resume to continue")
+finally:
+    checkpoint.close()
+checkpoint.discard()
+print('done')
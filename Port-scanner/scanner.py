@@ -0,0 +1,531 @@
+"""Asynchronous TCP connect scanner.
+
+Probes run concurrently (up to --concurrency connections in flight) and
+results are printed as they come in, so a full 1-65535 sweep of a host takes
+seconds instead of minutes. Targets can be hosts, CIDR ranges or files of
+either; probes are spread across hosts with a per-host cap, so one slow host
+doesn't hold up the rest. Against firewalls and IDSes that drop bursts,
+--rate paces connection attempts (with jitter) and --per-subnet shares the
+load out across a big range, so drops don't show up as filtered ports.
+
+    python scanner.py 192.168.1.10
+    python scanner.py 192.168.1.10 -p all -c 2000 -t 0.3 -r 1
+    python scanner.py 10.0.0.0/24 db1.lan --top-ports 1000 --per-host 32
+    python scanner.py -i hosts.txt -p 22,80,443
+    python scanner.py 10.0.0.0/16 --top-ports 100 --rate 2000 --per-subnet 64 --randomize
+    python scanner.py 10.0.0.0/16 -p all --checkpoint sweep.ckpt    # Ctrl-C, then
+    python scanner.py 10.0.0.0/16 -p all --checkpoint sweep.ckpt --resume
+"""
+import argparse
+import asyncio
+import errno
+import ipaddress
+import math
+import os
+import random
+import socket
+import sys
+import time
+from collections import Counter, deque, namedtuple
+
+OPEN, CLOSED, FILTERED, UNRESOLVED = "open", "closed", "filtered", "unresolved"
+
+Result = namedtuple("Result", "host port state rtt")
+
+# Probe timeouts: start at `initial` until a host has answered, then follow
+# its measured round-trip time, kept within [minimum, maximum]
+Timing = namedtuple("Timing", "initial minimum maximum")
+
+# nmap's 100 most common TCP ports, most common first
+TOP_PORTS = [
+    80, 23, 443, 21, 22, 25, 3389, 110, 445, 139, 143, 53, 135, 3306, 8080, 1723, 111, 995, 993, 5900,
+    1025, 587, 8888, 199, 1720, 465, 548, 113, 81, 6001, 10000, 514, 5060, 179, 1026, 2000, 8443, 8000,
+    32768, 554, 26, 1433, 49152, 2001, 515, 8008, 49154, 1027, 5666, 646, 5000, 5631, 631, 49153, 8081,
+    2049, 88, 79, 5800, 106, 2121, 1110, 49155, 6000, 513, 990, 5357, 427, 49156, 543, 544, 5101, 144, 7,
+    389, 8009, 3128, 444, 9999, 5009, 7070, 5190, 3000, 5432, 1900, 3986, 13, 1029, 9, 5051, 6646, 49157,
+    1028, 873, 1755, 2717, 4899, 9100, 119, 37,
+]
+NMAP_SERVICES = ("/usr/share/nmap/nmap-services", "/usr/local/share/nmap/nmap-services")
+
+def parse_ports(spec):
+    """'22,80,8000-8100' or 'all' -> sorted list of ports"""
+    if spec == "all":
+        return list(range(1, 65536))
+    ports = set()
+    for part in spec.split(","):
+        if "-" in part:
+            low, high = part.split("-")
+            ports.update(range(int(low), int(high) + 1))
+        elif part:
+            ports.add(int(part))
+    if not ports or min(ports) < 1 or max(ports) > 65535:
+        raise ValueError(f"bad port spec: {spec}")
+    return sorted(ports)
+
+def top_ports(n):
+    """The n most common TCP ports: ranked by nmap-services when nmap is
+    installed, otherwise TOP_PORTS padded with the lowest remaining ports."""
+    for path in NMAP_SERVICES:
+        if os.path.exists(path):
+            ranked = []
+            with open(path) as f:
+                for line in f:
+                    fields = line.split()
+                    if len(fields) >= 3 and fields[1].endswith("/tcp"):
+                        ranked.append((float(fields[2]), int(fields[1].split("/")[0])))
+            return [port for _, port in sorted(ranked, reverse=True)[:n]]
+    ports = TOP_PORTS[:n]
+    taken = set(ports)
+    ports += [p for p in range(1, 65536) if p not in taken][:n - len(ports)]
+    return ports
+
+def permutation(n, rng=random):
+    """0..n-1 in a pseudo-random order without building the list: a keyed
+    4-round Feistel network shuffles the smallest even-bit-width power of
+    two >= n, and outputs past n are skipped (at most 3 in 4)."""
+    half = max(1, ((n - 1).bit_length() + 1) // 2)
+    mask = (1 << half) - 1
+    keys = [rng.getrandbits(32) for _ in range(4)]
+    for i in range(1 << 2 * half):
+        left, right = i >> half, i & mask
+        for key in keys:
+            left, right = right, left ^ (((right ^ key) * 0x9E3779B1) >> 11 & mask)
+        value = left << half | right
+        if value < n:
+            yield value
+
+def iter_targets(specs, randomize=False):
+    """Expand hosts, CIDR ranges and comma lists lazily: a /8 is walked
+    address by address, never built as a list. With `randomize` each range
+    is walked in a random order (see permutation)."""
+    for spec in specs:
+        for item in spec.split(","):
+            item = item.strip()
+            if not item:
+                continue
+            if "/" in item:
+                network = ipaddress.ip_network(item, strict=False)
+                if not randomize:
+                    yield from (str(ip) for ip in (network.hosts() if network.num_addresses > 1 else network))
+                    continue
+                # Same addresses as network.hosts(): no network address on
+                # ranges bigger than /31 (/127), no broadcast on IPv4 ones
+                first = int(network.num_addresses > 2)
+                last = int(network.num_addresses > 2 and network.version == 4)
+                base = network.network_address + first
+                yield from (str(base + i) for i in permutation(network.num_addresses - first - last))
+            else:
+                yield item
+
+def subnet(host):
+    """The /24 (IPv6: /64) an address is in; a hostname is its own subnet"""
+    try:
+        ip = ipaddress.ip_address(host)
+    except ValueError:
+        return host
+    return ipaddress.ip_network(f"{ip}/{24 if ip.version == 4 else 64}", strict=False)
+
+def iter_target_file(path, randomize=False):
+    """Targets from a file (or - for stdin), one spec per line, # comments."""
+    with (sys.stdin if path == "-" else open(path)) as f:
+        for line in f:
+            yield from iter_targets([line.split("#")[0]], randomize)
+
+def max_concurrency(wanted):
+    # Every probe holds a socket; stay under the open-file limit
+    try:
+        import resource
+    except ImportError:  # Windows
+        return wanted
+    soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    return max(1, min(wanted, soft - 64))
+
+async def resolve(host):
+    """Look the host up once; probes then connect to the address directly."""
+    loop = asyncio.get_running_loop()
+    family, _, _, _, address = (await loop.getaddrinfo(host, None, type=socket.SOCK_STREAM))[0]
+    return family, address[0]
+
+async def connect(sock, address, timeout):
+    loop = asyncio.get_running_loop()
+    if hasattr(asyncio, "timeout"):  # 3.11+, far cheaper per probe than wait_for
+        async with asyncio.timeout(timeout):
+            await loop.sock_connect(sock, address)
+    else:
+        await asyncio.wait_for(loop.sock_connect(sock, address), timeout)
+
+async def probe(target, port, timeout):
+    """One connect attempt to a resolved (family, ip) -> (state, seconds taken)"""
+    family, ip = target
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setblocking(False)
+    start = time.perf_counter()
+    try:
+        await connect(sock, (ip, port), timeout)
+    except asyncio.TimeoutError:
+        return FILTERED, None
+    except ConnectionRefusedError:
+        return CLOSED, time.perf_counter() - start
+    except OSError as e:
+        if e.errno in (errno.EMFILE, errno.ENFILE):
+            raise
+        return FILTERED, None  # unreachable, ICMP-prohibited, ...
+    finally:
+        sock.close()
+    return OPEN, time.perf_counter() - start
+
+class RateLimit:
+    """Token bucket pacing probes to `rate` a second, in bursts of at most
+    `burst`. Each probe takes a token, going into debt and sleeping it off
+    when the bucket is empty. With `jitter` a probe costs anywhere within
+    that fraction of a token either way, so probes don't go out on a fixed
+    beat but still average `rate`."""
+
+    def __init__(self, rate, burst=None, jitter=0.0):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate / 100)
+        self.jitter = jitter
+        self.tokens = self.burst
+        self.last = time.monotonic()
+
+    async def wait(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        self.tokens -= random.uniform(1 - self.jitter, 1 + self.jitter) if self.jitter else 1
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+
+class Host:
+    """A target being scanned, with TCP-style timing state: smoothed RTT and
+    variance (RFC 6298) give the probe timeout, and a congestion window caps
+    probes in flight, halved when the host starts losing probes."""
+
+    def __init__(self, name, ports, timing, per_host):
+        self.name = name
+        self.subnet = subnet(name)
+        self.ports = iter(ports)
+        self.inflight = 0
+        self.failed = False
+        self.target = asyncio.ensure_future(resolve(name))
+        self.timing = timing
+        self.srtt = self.rttvar = None
+        self.rto = timing.initial
+        self.max_cwnd = per_host
+        self.cwnd = float(per_host)
+        self.last_cut = 0.0
+
+    def timeout(self, attempt):
+        # Retries back off exponentially, like TCP retransmits
+        return min(self.rto * 2 ** attempt, self.timing.maximum)
+
+    def on_answer(self, rtt):
+        """An open or closed port answered after `rtt` seconds."""
+        if self.srtt is None:
+            self.srtt, self.rttvar = rtt, rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        self.rto = min(max(self.srtt + 4 * self.rttvar, self.timing.minimum), self.timing.maximum)
+        # Additive increase: about +1 per window's worth of answers
+        self.cwnd = min(self.cwnd + 1 / self.cwnd, self.max_cwnd)
+
+    def on_loss(self):
+        """A retry got an answer where the first attempt timed out, i.e. the
+        probe was dropped rather than filtered: back off, at most once per
+        timeout period so one burst of drops counts once."""
+        now = time.monotonic()
+        if now - self.last_cut >= self.rto:
+            self.cwnd = max(1.0, self.cwnd / 2)
+            self.last_cut = now
+
+class Scheduler:
+    """Hands out (host, port) probes round-robin across the active hosts,
+    each capped at its congestion window. Hosts are pulled from the (lazy)
+    target iterator only while the active ones can't use the whole
+    `concurrency` budget between them."""
+
+    def __init__(self, hosts, ports, concurrency, per_host, timing, skip=None, per_subnet=None, randomize=False):
+        self.hosts = iter(hosts)
+        self.ports = ports
+        self.skip = skip or {}
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.per_subnet = per_subnet
+        self.subnets = Counter()
+        self.randomize = randomize
+        self.timing = timing
+        self.active = deque()
+        self.exhausted = False
+        self.releases = 0
+        self.slot_freed = asyncio.Condition()
+
+    @property
+    def done(self):
+        return self.exhausted and not self.active
+
+    def take(self):
+        """Next (host, port) to probe, or None if every active host is at
+        its cap (or there is nothing left)."""
+        while True:
+            for _ in range(len(self.active)):
+                host = self.active[0]
+                if host.inflight < host.cwnd and not self.subnet_full(host.subnet):
+                    port = next(host.ports, None)
+                    if port is None:
+                        self.active.popleft()  # stragglers still in flight finish on their own
+                        continue
+                    self.active.rotate(-1)
+                    host.inflight += 1
+                    self.subnets[host.subnet] += 1
+                    return host, port
+                self.active.rotate(-1)
+            if self.exhausted or self.capacity() >= self.concurrency:
+                return None
+            name = next(self.hosts, None)
+            if name is None:
+                self.exhausted = True
+                return None
+            ports = self.ports
+            if done := self.skip.get(name):
+                if len(done) >= len(ports):
+                    continue
+            if self.randomize:
+                ports = map(ports.__getitem__, permutation(len(ports)))
+            if done:
+                ports = (port for port in ports if port not in done)
+            self.active.append(Host(name, ports, self.timing, self.per_host))
+
+    def subnet_full(self, key):
+        return self.per_subnet is not None and self.subnets[key] >= self.per_subnet
+
+    def capacity(self):
+        # Probes the active hosts could have in flight at once: their
+        # windows, less whatever the per-subnet caps take off
+        windows = Counter()
+        for host in self.active:
+            windows[host.subnet] += math.ceil(host.cwnd)
+        if self.per_subnet is None:
+            return sum(windows.values())
+        return sum(min(window, self.per_subnet) for window in windows.values())
+
+    async def release(self, host):
+        host.inflight -= 1
+        self.subnets[host.subnet] -= 1
+        if not self.subnets[host.subnet]:
+            del self.subnets[host.subnet]
+        self.releases += 1
+        async with self.slot_freed:
+            if self.done:
+                self.slot_freed.notify_all()
+            else:
+                self.slot_freed.notify()
+
+    async def wait(self, seen):
+        # `seen` is self.releases when take() came back empty; a release
+        # since then means there may be a slot already
+        async with self.slot_freed:
+            if self.releases == seen and not self.done:
+                await self.slot_freed.wait()
+
+async def scan_targets(hosts, ports, concurrency=500, per_host=None, timeout=1.0, retries=1,
+                       min_timeout=0.1, max_timeout=5.0, skip=None, rate=None, jitter=0.0, per_subnet=None,
+                       randomize=False):
+    """Scan `ports` on every host in `hosts` (any iterable, consumed lazily),
+    yielding Results in completion order. At most `concurrency` probes are in
+    flight overall, `per_host` against any single host and `per_subnet`
+    against any /24. `timeout` is the initial probe timeout; it then adapts
+    to each host's RTT. `rate` caps connection attempts per second (see
+    RateLimit for `jitter`); `randomize` probes each host's ports in a
+    random order. `skip` (a dict, or a Checkpoint) maps host names to
+    ports already scanned."""
+    concurrency = max_concurrency(concurrency)
+    per_host = min(per_host or concurrency, concurrency)
+    timing = Timing(timeout, min(min_timeout, timeout), max(max_timeout, timeout))
+    sched = Scheduler(hosts, ports, concurrency, per_host, timing, skip, per_subnet, randomize)
+    limit = RateLimit(rate, jitter=jitter) if rate else None
+    results = asyncio.Queue()
+
+    async def run_probe(host, port):
+        try:
+            target = await host.target
+        except OSError:  # lookup failed: report it once, drop its remaining ports
+            if not host.failed:
+                host.failed = True
+                host.ports = iter(())
+                results.put_nowait(Result(host.name, None, UNRESOLVED, None))
+            return
+        # Only silence is retried: a drop may just be a lost SYN
+        for attempt in range(retries + 1):
+            if limit:
+                await limit.wait()
+            state, rtt = await probe(target, port, host.timeout(attempt))
+            if state != FILTERED:
+                host.on_answer(rtt)
+                if attempt:
+                    host.on_loss()
+                break
+        results.put_nowait(Result(host.name, port, state, rtt))
+
+    async def worker():
+        while not sched.done:
+            seen = sched.releases
+            job = sched.take()
+            if job is None:
+                await sched.wait(seen)
+                continue
+            try:
+                await run_probe(*job)
+            finally:
+                await sched.release(job[0])
+
+    async def run():
+        try:
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        finally:
+            results.put_nowait(None)
+
+    runner = asyncio.create_task(run())
+    try:
+        while (result := await results.get()) is not None:
+            yield result
+        await runner  # re-raise worker errors
+    finally:
+        runner.cancel()
+
+class Checkpoint:
+    """Progress of a scan kept on disk, so an interrupted one can resume.
+
+    Results go to a store.ResultStore at `path` (2 bits per probe, in an
+    mmap'd file), so the checkpoint stays small however long the scan runs
+    and nothing written is lost if the process is killed. Opened with
+    resume=True on an existing one, it is passed as scan_targets' `skip`
+    to leave out the ports already scanned, and `found` holds the open
+    ports seen so far. An optional `header` records what was being
+    scanned. discard() it (after close()) once the scan has finished."""
+
+    def __init__(self, path, ports, resume=False, header=None):
+        from store import ResultStore  # store imports this module
+        self.path = path
+        if not resume:
+            self.discard()
+        self.store = ResultStore(ports, path, label=header)
+        self.header = self.store.label
+        self.found = [Result(host, port, OPEN, None)
+                      for host in self.store.names for port in self.store.ports_in(host)]
+
+    def get(self, host):
+        """Ports of `host` already scanned (None if none), for `skip`"""
+        return self.store.scanned(host)
+
+    def record(self, result):
+        # Unresolved hosts aren't recorded, so a resumed scan tries them again
+        self.store.add(result)
+
+    def close(self):
+        self.store.close()
+
+    def discard(self):
+        """Delete the checkpoint's files"""
+        for name in (self.path, self.path + ".hosts"):
+            if os.path.exists(name):
+                os.remove(name)
+
+def scan(host, ports, concurrency=500, timeout=1.0, retries=1):
+    """Scan `ports` on a single host, yielding Results in completion order."""
+    return scan_targets([host], ports, concurrency, None, timeout, retries)
+
+async def checkpointed(results, checkpoint):
+    try:
+        async for result in results:
+            checkpoint.record(result)
+            yield result
+    finally:
+        checkpoint.close()
+    checkpoint.discard()  # finished cleanly: nothing left to resume
+
+async def stored(results, store):
+    try:
+        async for result in results:
+            store.add(result)
+            yield result
+    finally:
+        store.close()
+
+async def main(args):
+    ports = top_ports(args.top_ports) if args.top_ports else parse_ports(args.ports)
+    targets = iter_targets(args.targets, args.randomize)
+    if args.input_file:
+        targets = (t for source in (targets, iter_target_file(args.input_file, args.randomize)) for t in source)
+    counts = {OPEN: 0, CLOSED: 0, FILTERED: 0, UNRESOLVED: 0}
+    hosts = set()
+    start = time.perf_counter()
+    rate = f", {args.rate:g}/s" if args.rate else ""
+    print(f"Scanning {len(ports)} ports per host, {args.concurrency} at a time ({args.per_host} per host{rate})\n")
+
+    def report(result, note=""):
+        counts[result.state] += 1
+        hosts.add(result.host)
+        if result.state == UNRESOLVED:
+            print(f"{result.host}: cannot resolve", file=sys.stderr)
+        elif result.state == OPEN or args.verbose:
+            print(f"{result.host}:{result.port} {result.state.upper()}{note}")
+
+    checkpoint = None
+    if args.checkpoint:
+        checkpoint = Checkpoint(args.checkpoint, ports, args.resume)
+        for result in checkpoint.found:
+            report(result, " (earlier run)")
+    results = scan_targets(targets, ports, args.concurrency, args.per_host, args.timeout, args.retries,
+                           args.min_timeout, args.max_timeout, checkpoint, args.rate,
+                           args.jitter, args.per_subnet, args.randomize)
+    if checkpoint:
+        results = checkpointed(results, checkpoint)
+    if args.store:
+        from store import ResultStore
+        results = stored(results, ResultStore(ports, args.store))
+    if args.banners:
+        import banner
+        results = banner.with_services(results, timeout=args.banner_timeout)
+    async for result in results:
+        if not isinstance(result, Result):
+            print(f"{result.host}:{result.port} {result.name} {result.banner}".rstrip())
+            continue
+        report(result)
+    elapsed = time.perf_counter() - start
+    print(f"\n{len(hosts)} hosts: {counts[OPEN]} open, {counts[CLOSED]} closed, "
+          f"{counts[FILTERED]} filtered in {elapsed:.2f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Asynchronous TCP connect scanner")
+    parser.add_argument("targets", nargs="*", help="hosts, IPs or CIDR ranges (comma lists allowed)")
+    parser.add_argument("-i", "--input-file", help="file of targets, one per line (- for stdin)")
+    parser.add_argument("-p", "--ports", default="1-1024", help="e.g. 22,80,8000-8100 or all (default 1-1024)")
+    parser.add_argument("--top-ports", type=int, help="scan the N most common ports instead of -p")
+    parser.add_argument("-c", "--concurrency", type=int, default=500, help="probes in flight overall (default 500)")
+    parser.add_argument("--per-host", type=int, default=64, help="probes in flight per host (default 64)")
+    parser.add_argument("--per-subnet", type=int, help="probes in flight per /24 (IPv6: /64), to share out big ranges")
+    parser.add_argument("--rate", type=float, help="connection attempts per second, overall (default unlimited)")
+    parser.add_argument("--jitter", type=float, default=0.3,
+                        help="randomize gaps between probes by this fraction under --rate (default 0.3)")
+    parser.add_argument("--randomize", action="store_true", help="walk ranges and ports in a random order")
+    parser.add_argument("-t", "--timeout", type=float, default=1.0,
+                        help="initial connect timeout in seconds, adapted per host from measured RTT (default 1)")
+    parser.add_argument("--min-timeout", type=float, default=0.1, help="adaptive timeout floor (default 0.1)")
+    parser.add_argument("--max-timeout", type=float, default=5.0, help="adaptive timeout ceiling (default 5)")
+    parser.add_argument("-r", "--retries", type=int, default=1, help="extra attempts for unanswered ports (default 1)")
+    parser.add_argument("-b", "--banners", action="store_true", help="identify services on open ports")
+    parser.add_argument("--banner-timeout", type=float, default=2.0, help="seconds per banner grab (default 2)")
+    parser.add_argument("--store", metavar="FILE", help="save every port's state to a compact store (see store.py)")
+    parser.add_argument("--checkpoint", metavar="FILE", help="keep scan progress in FILE (and FILE.hosts), deleted once the scan completes")
+    parser.add_argument("--resume", action="store_true", help="skip probes already in the --checkpoint file")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print closed and filtered ports too")
+    args = parser.parse_args()
+    if not args.targets and not args.input_file:
+        parser.error("no targets given")
+    if args.resume and not args.checkpoint:
+        parser.error("--resume needs --checkpoint")
+    try:
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        pass
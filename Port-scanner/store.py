@@ -0,0 +1,250 @@
+"""Compact store for the results of large scans.
+
+Each host gets a row of two bit-planes over the scanned port list, so a
+probe costs 2 bits instead of a Result tuple (~100 bytes plus a slot in
+some list or dict). Bit i of a plane is ports[i]:
+
+    answered  open-or-filtered
+       1             1            open
+       1             0            closed
+       0             1            filtered
+       0             0            not scanned
+
+A /16 swept on all ports is 65536 x 16 KiB = 1 GiB, which is why the rows
+can live in an mmap'd file instead of memory: pages are only touched as
+hosts are written, and the file stays sparse for hosts never reached.
+Host names and the port list (and an optional label saying what was
+scanned) are kept next to it in FILE.hosts.
+
+    python store.py show sweep.bits                # open ports per host
+    python store.py show sweep.bits --port 22      # hosts with 22 open
+    python store.py diff monday.bits tuesday.bits  # ports opened / closed
+"""
+import argparse
+import mmap
+import os
+from array import array
+
+from scanner import OPEN, CLOSED, FILTERED, UNRESOLVED, parse_ports
+
+def format_ports(ports):
+    """Sorted ports -> '1-1024,3306', the inverse of parse_ports"""
+    spans = []
+    for port in ports:
+        if spans and spans[-1][1] == port - 1:
+            spans[-1][1] = port
+        else:
+            spans.append([port, port])
+    return ",".join(str(low) if low == high else f"{low}-{high}" for low, high in spans)
+
+class Scanned:
+    """The ports of one host that have a state (its two planes OR-ed), with
+    just len() and `in`: what scan_targets' `skip` needs per host."""
+
+    def __init__(self, store, mask):
+        self.store = store
+        self.bits = mask.to_bytes(store.plane, "little")
+        self.count = mask.bit_count()
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, port):
+        i = self.store.bit(port)
+        return i is not None and self.bits[i >> 3] >> (i & 7) & 1 == 1
+
+class ResultStore:
+    """Port states of many hosts over one port list, as bit-planes in a
+    bytearray or, with `path`, an mmap'd file (reopened if it exists)."""
+
+    def __init__(self, ports=None, path=None, label=None):
+        self.path = path
+        self.hosts = {}
+        self.names = []
+        self.label = label
+        existing = path and os.path.exists(path + ".hosts")
+        if existing:
+            with open(path + ".hosts") as f:
+                stored = parse_ports(f.readline().split(maxsplit=2)[2])
+                for line in f:
+                    if line.startswith("# label "):
+                        self.label = line[len("# label "):].rstrip("\n")
+                    else:
+                        self.names.append(line.rstrip("\n"))
+            self.hosts = {name: i for i, name in enumerate(self.names)}
+            if ports is not None and not set(ports) <= set(stored):
+                raise ValueError(f"{path} only holds ports {format_ports(stored)}")
+            ports = stored
+        elif ports is None:
+            raise FileNotFoundError(f"no result store at {path}")
+        self.ports = array("H", sorted(ports))
+        self.first = self.ports[0]
+        # Contiguous port lists (the usual case) need no lookup table
+        if self.ports[-1] - self.first + 1 == len(self.ports):
+            self.lookup = None
+        else:
+            self.lookup = {port: i for i, port in enumerate(self.ports)}
+        self.plane = (len(self.ports) + 7) // 8
+        self.row = 2 * self.plane
+        self.capacity = max(len(self.names), 16)
+        if path:
+            self.file = open(path, "a+b")
+            os.ftruncate(self.file.fileno(), max(os.fstat(self.file.fileno()).st_size, self.capacity * self.row))
+            self.capacity = os.fstat(self.file.fileno()).st_size // self.row
+            self.data = mmap.mmap(self.file.fileno(), self.capacity * self.row)
+            # Line-buffered so a killed scan can't leave rows without names
+            self.names_file = open(path + ".hosts", "a", buffering=1)
+            if not existing:
+                self.names_file.write(f"# ports {format_ports(self.ports)}\n")
+                if label is not None:
+                    self.names_file.write(f"# label {label}\n")
+        else:
+            self.data = bytearray(self.capacity * self.row)
+
+    def grow(self):
+        self.capacity *= 2
+        if self.path:
+            self.data.close()
+            os.ftruncate(self.file.fileno(), self.capacity * self.row)
+            self.data = mmap.mmap(self.file.fileno(), self.capacity * self.row)
+        else:
+            self.data.extend(bytes(len(self.data)))
+
+    def index(self, host):
+        i = self.hosts.get(host)
+        if i is None:
+            i = self.hosts[host] = len(self.names)
+            self.names.append(host)
+            if i == self.capacity:
+                self.grow()
+            if self.path:
+                self.names_file.write(host + "\n")
+        return i
+
+    def bit(self, port):
+        """Position of `port` in the rows, or None if it isn't stored"""
+        if self.lookup is not None:
+            return self.lookup.get(port)
+        i = port - self.first
+        return i if 0 <= i < len(self.ports) else None
+
+    def set(self, host, port, state):
+        i = self.bit(port)
+        if i is None:
+            raise KeyError(f"port {port} is not in this store")
+        answered = self.index(host) * self.row + (i >> 3)
+        other = answered + self.plane
+        mask = 1 << (i & 7)
+        data = self.data
+        if state == OPEN:
+            data[answered] |= mask
+            data[other] |= mask
+        elif state == CLOSED:
+            data[answered] |= mask
+            data[other] &= ~mask
+        else:
+            data[answered] &= ~mask
+            data[other] |= mask
+
+    def add(self, result):
+        if result.state != UNRESOLVED:
+            self.set(result.host, result.port, result.state)
+
+    def get(self, host, port):
+        """State of one probe, or None if it wasn't scanned"""
+        i, position = self.hosts.get(host), self.bit(port)
+        if i is None or position is None:
+            return None
+        offset, bit = divmod(position, 8)
+        answered = self.data[i * self.row + offset] >> bit & 1
+        other = self.data[i * self.row + self.plane + offset] >> bit & 1
+        return (None, FILTERED, CLOSED, OPEN)[answered << 1 | other]
+
+    def mask(self, host, state=OPEN):
+        """Bit i set where ports[i] is in `state`, as one int for set operations"""
+        i = self.hosts.get(host)
+        if i is None:
+            return 0
+        base = i * self.row
+        answered = int.from_bytes(self.data[base:base + self.plane], "little")
+        other = int.from_bytes(self.data[base + self.plane:base + self.row], "little")
+        return {OPEN: answered & other, CLOSED: answered & ~other, FILTERED: other & ~answered}[state]
+
+    def scanned(self, host):
+        """Scanned view of the ports `host` has a state for, or None"""
+        i = self.hosts.get(host)
+        if i is None:
+            return None
+        base = i * self.row
+        answered = int.from_bytes(self.data[base:base + self.plane], "little")
+        other = int.from_bytes(self.data[base + self.plane:base + self.row], "little")
+        return Scanned(self, answered | other)
+
+    def unmask(self, mask):
+        ports = []
+        while mask:
+            low = mask & -mask
+            ports.append(self.ports[low.bit_length() - 1])
+            mask ^= low
+        return ports
+
+    def ports_in(self, host, state=OPEN):
+        return self.unmask(self.mask(host, state))
+
+    def count(self, state=OPEN):
+        return sum(self.mask(host, state).bit_count() for host in self.names)
+
+    def hosts_with(self, port, state=OPEN):
+        """Hosts where `port` is in `state`"""
+        return [host for host in self.names if self.get(host, port) == state]
+
+    def diff(self, newer):
+        """(host, ports opened, ports closed) for every host whose open
+        ports differ in `newer`; a host only scanned in one of the two
+        counts as having nothing open in the other."""
+        same_layout = self.ports == newer.ports
+        for host in dict.fromkeys(self.names + newer.names):
+            if same_layout:
+                before, after = self.mask(host), newer.mask(host)
+                if before != after:
+                    yield host, self.unmask(after & ~before), self.unmask(before & ~after)
+            else:
+                before, after = set(self.ports_in(host)), set(newer.ports_in(host))
+                if before != after:
+                    yield host, sorted(after - before), sorted(before - after)
+
+    def close(self):
+        if self.path:
+            self.data.flush()
+            self.data.close()
+            self.file.close()
+            self.names_file.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Query scan result stores")
+    commands = parser.add_subparsers(dest="command", required=True)
+    show = commands.add_parser("show", help="open ports per host")
+    show.add_argument("store")
+    show.add_argument("--port", type=int, help="only list the hosts with this port open")
+    diff = commands.add_parser("diff", help="ports opened and closed between two scans")
+    diff.add_argument("old")
+    diff.add_argument("new")
+    args = parser.parse_args()
+
+    if args.command == "show":
+        store = ResultStore(path=args.store)
+        if args.port:
+            for host in store.hosts_with(args.port):
+                print(host)
+        else:
+            for host in store.names:
+                print(f"{host}: {format_ports(store.ports_in(host)) or '-'}")
+            print(f"\n{len(store.names)} hosts, {store.count(OPEN)} open, {store.count(CLOSED)} closed, "
+                  f"{store.count(FILTERED)} filtered")
+    else:
+        old, new = ResultStore(path=args.old), ResultStore(path=args.new)
+        for host, opened, closed in old.diff(new):
+            print(f"{host}: +{format_ports(opened) or '-'} -{format_ports(closed) or '-'}")
+
+if __name__ == "__main__":
+    main()
@@ -1,50 +1,323 @@
 #!/usr/bin/env python3
 """
 Network Security Scanner v1.0
-Built for 1st year hackathon - Uses nmap, netcat, socket
+Built for 1st year hackathon - Uses socket and asyncio (nmap-style host
+discovery, netcat-style banner grabbing; no nmap needed)
 Detects: Open ports, device types, vulnerabilities
 """
 
-import subprocess
+import argparse
+import asyncio
+import errno
+import os
+import random
 import socket
-import threading
+import struct
 import json
-import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import ipaddress
+import sys
+
+# Shared with the port scanner: a lazy random order over a whole network
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Port-scanner"))
+from scanner import permutation, max_concurrency
+
+class Stage:
+    """One step of the scan pipeline: `workers` tasks take items from
+    `inbox`, await work(item) and pass whatever isn't None to the next
+    stage's inbox. Queues are bounded, so a slow stage holds up the ones
+    before it instead of piling up work. Counts items, failures and busy
+    time."""
+    
+    def __init__(self, name, work, workers, inbox_size=None):
+        self.name = name
+        self.work = work
+        self.workers = workers
+        self.inbox = asyncio.Queue(inbox_size or 2 * workers)
+        self.next = None
+        self.items = 0
+        self.failed = 0
+        self.busy = 0.0
+    
+    async def worker(self):
+        while (item := await self.inbox.get()) is not None:
+            start = time.perf_counter()
+            try:
+                result = await self.work(item)
+            except Exception as e:
+                # One bad host mustn't stop the scan: drop it, keep draining
+                self.failed += 1
+                result = None
+                print(f"⚠️ {self.name} failed for {item['ip'] if isinstance(item, dict) else item}: {e!r}")
+            self.busy += time.perf_counter() - start
+            self.items += 1
+            if result is not None and self.next:
+                await self.next.inbox.put(result)
+    
+    async def run(self):
+        await asyncio.gather(*(self.worker() for _ in range(self.workers)))
+        if self.next:
+            for _ in range(self.next.workers):
+                await self.next.inbox.put(None)
 
 class NetworkScanner:
-    def __init__(self, network="0.0.0.0/24"):
+    PORTS = [21, 22, 23, 80, 443, 3389, 8080]
+    
+    # Incremental mode re-probes a port that has stayed closed on a stable
+    # host only every few runs, at most every STABLE_PERIOD
+    STABLE_PERIOD = 8
+    
+    # Host discovery: a host is up if any of these ports accepts or refuses
+    # a connection (a refusal is the host's own RST)
+    DISCOVERY_PORTS = [80, 443, 22, 445, 139, 3389, 8080, 53]
+    DISCOVERY_TIMEOUT = 1.0
+    DISCOVERY_WORKERS = 128  # hosts at once, each with a socket per port
+    SOCKET_RETRY = 0.1  # seconds to wait when out of sockets (EMFILE/ENFILE)
+    
+    # Workers per full_scan stage; DNS lookups block, so they run on threads
+    PORT_WORKERS = 32
+    DNS_WORKERS = 16
+    CHECK_WORKERS = 32
+    
+    def __init__(self, network="0.0.0.0/24", checkpoint="radar_checkpoint.jsonl", rate=None, jitter=0.3):
         self.network = ipaddress.IPv4Network(network)
         self.results = []
         self.live_hosts = []
+        self.checkpoint = checkpoint
+        self.rate = rate  # probes per second, None for no limit
+        self.jitter = jitter
+        self.next_probe = 0.0
+        self.previous = {}
+        self.probes = 0
+        self.sweep_done = False
+    
+    def reserve(self):
+        """Seconds to wait before the next probe to hold probes to self.rate
+        a second, each gap randomized by up to ±jitter so firewalls and IDSes
+        don't see bursts or a fixed beat"""
+        if not self.rate:
+            return 0
+        now = time.monotonic()
+        wait = max(0.0, self.next_probe - now)
+        gap = random.uniform(1 - self.jitter, 1 + self.jitter) / self.rate
+        self.next_probe = max(now, self.next_probe) + gap
+        return wait
+    
+    async def apace(self):
+        wait = self.reserve()
+        if wait:
+            await asyncio.sleep(wait)
+    
+    def load_checkpoint(self):
+        """Pick up an interrupted scan: live hosts and finished devices"""
+        try:
+            with open(self.checkpoint) as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return False
+        if not lines:
+            return False
+        state = json.loads(lines[0])
+        if state.get("network") != str(self.network):
+            print(f"⚠️ {self.checkpoint} is for {state.get('network')}, starting over")
+            return False
+        if "live_hosts" in state:  # written before discovery streamed hosts
+            self.live_hosts, self.sweep_done = state["live_hosts"], True
+        for line in lines[1:]:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:  # cut off mid-write
+                break
+            if "live" in entry:
+                self.live_hosts.append(entry["live"])
+            elif "sweep_done" in entry:
+                self.sweep_done = True
+            else:
+                entry["banners"] = {int(port): banner for port, banner in entry.get("banners", {}).items()}
+                self.results.append(entry)
+        print(f"♻️ Resuming: {len(self.results)}/{len(self.live_hosts)} devices already scanned"
+              f"{'' if self.sweep_done else ', discovery unfinished'}")
+        return True
+    
+    def save_checkpoint(self, entry=None):
+        """Start the checkpoint file, or append an entry to it: a live host
+        ({"live": ip}), the end of discovery or a finished device"""
+        if entry is None:
+            with open(self.checkpoint, "w") as f:
+                f.write(json.dumps({"network": str(self.network)}) + "\n")
+        else:
+            with open(self.checkpoint, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+    
+    def candidates(self):
+        """Addresses to probe for discovery: in incremental mode the known
+        devices first, by priority, then the rest of the network at random.
+        Lazy, so a /8 isn't listed (or shuffled) up front."""
+        yield from sorted((ip for ip in self.previous if ipaddress.IPv4Address(ip) in self.network),
+                          key=self.priority)
+        # Same addresses as network.hosts(): no network/broadcast below /31
+        first, count = int(self.network.network_address), self.network.num_addresses
+        if count > 2:
+            first, count = first + 1, count - 2
+        for offset in permutation(count):
+            ip = str(ipaddress.IPv4Address(first + offset))
+            if ip not in self.previous:
+                yield ip
+    
+    def read_arp_cache(self):
+        """Neighbours the kernel already has MAC addresses for (Linux only)"""
+        try:
+            with open("/proc/net/arp") as f:
+                entries = [line.split() for line in f.readlines()[1:]]
+        except OSError:
+            return []
+        # Flags 0x2: entry complete, the host answered ARP
+        return [fields[0] for fields in entries
+                if len(fields) >= 3 and int(fields[2], 16) & 0x2
+                and ipaddress.IPv4Address(fields[0]) in self.network]
+    
+    async def connect(self, ip, port, timeout):
+        """asyncio.open_connection, waiting for a free socket when the process
+        is out of them: EMFILE says nothing about the host, so it mustn't
+        read as down or closed"""
+        while True:
+            try:
+                return await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+            except OSError as e:
+                if e.errno not in (errno.EMFILE, errno.ENFILE):
+                    raise
+            await asyncio.sleep(self.SOCKET_RETRY)
+    
+    async def tcp_ping(self, ip, port):
+        await self.apace()
+        try:
+            _, writer = await self.connect(ip, port, self.DISCOVERY_TIMEOUT)
+        except ConnectionRefusedError:
+            return True
+        except (asyncio.TimeoutError, OSError):
+            return False
+        writer.close()
+        return True
+    
+    async def tcp_alive(self, ip):
+        """Connect to the discovery ports at once; up on the first answer"""
+        probes = [asyncio.ensure_future(self.tcp_ping(ip, port)) for port in self.DISCOVERY_PORTS]
+        try:
+            for answer in asyncio.as_completed(probes):
+                if await answer:
+                    return True
+            return False
+        finally:
+            for probe in probes:
+                probe.cancel()
+    
+    def icmp_socket(self):
+        """Raw ICMP socket, or None without the privileges for one"""
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+        except OSError:
+            return None
+        sock.setblocking(False)
+        return sock
+    
+    def echo_request(self, ident, seq):
+        header = struct.pack("!BBHHH", 8, 0, 0, ident, seq)
+        payload = b"radar-ping"
+        data = header + payload
+        total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+        total = (total >> 16) + (total & 0xFFFF)
+        checksum = ~(total + (total >> 16)) & 0xFFFF
+        return struct.pack("!BBHHH", 8, 0, checksum, ident, seq) + payload
+    
+    async def icmp_sweep(self, sock, candidates, live):
+        """Ping every candidate, reporting hosts whose echo replies come back"""
+        loop = asyncio.get_running_loop()
+        ident = os.getpid() & 0xFFFF
+        
+        async def receive():
+            while True:
+                packet = await loop.sock_recv(sock, 1024)
+                if len(packet) < 20:
+                    continue
+                start = (packet[0] & 0x0F) * 4  # past the IP header
+                if len(packet) < start + 8:  # truncated or not an ICMP header
+                    continue
+                if packet[start] == 0 and struct.unpack("!H", packet[start + 4:start + 6])[0] == ident:
+                    source = socket.inet_ntoa(packet[12:16])
+                    if ipaddress.IPv4Address(source) in self.network:
+                        await live(source)
+        
+        receiver = asyncio.create_task(receive())
+        try:
+            for seq, ip in enumerate(candidates):
+                await self.apace()
+                try:
+                    sock.sendto(self.echo_request(ident, seq & 0xFFFF), (ip, 0))
+                except OSError:
+                    pass
+            await asyncio.sleep(self.DISCOVERY_TIMEOUT)  # last replies
+        finally:
+            receiver.cancel()
+            sock.close()
+    
+    async def discover(self, report):
+        """Find live hosts without nmap, awaiting report(ip) once for each as
+        soon as it's found: the ARP cache first, then ICMP echo (when
+        privileged) alongside TCP connects to DISCOVERY_PORTS"""
+        found = set()
+        
+        async def live(ip):
+            if ip not in found:
+                found.add(ip)
+                await report(ip)
+        
+        for ip in self.read_arp_cache():
+            await live(ip)
+        sock = self.icmp_socket()
+        icmp = asyncio.create_task(self.icmp_sweep(sock, self.candidates(), live)) if sock else None
+        pending = self.candidates()
+        
+        async def worker():
+            for ip in pending:
+                if ip not in found and await self.tcp_alive(ip):
+                    await live(ip)
+        
+        # Each worker holds a socket per discovery port: stay under the
+        # open-file limit (1024 by default on Linux)
+        sockets = max_concurrency(self.DISCOVERY_WORKERS * len(self.DISCOVERY_PORTS))
+        workers = max(1, sockets // len(self.DISCOVERY_PORTS))
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        if icmp:
+            await icmp
     
     def scan_live_hosts(self):
-        """Ping sweep to find live devices (Nmap style)"""
+        """Ping sweep to find live devices (Nmap style, without nmap)"""
         print("🔍 Scanning live hosts...")
-        cmd = ["nmap", "-sn", str(self.network)]
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        for line in result.stdout.split('\n'):
-            if 'Nmap scan report' in line:
-                ip = line.split()[-1]
-                if ip != 'Nmap':
-                    self.live_hosts.append(ip)
-                    print(f"✅ LIVE: {ip}")
-    
-    def port_scan(self, target, ports=[21,22,23,80,443,3389,8080]):
-        """Fast port scan using socket (like netcat)"""
-        open_ports = []
-        for port in ports:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(1)
-            result = sock.connect_ex((target, port))
-            if result == 0:
-                open_ports.append(port)
-                service = self.get_service_name(port)
-                print(f"  🟢 {target}:{port} ({service})")
-            sock.close()
-        return open_ports
+        
+        async def report(ip):
+            self.live_hosts.append(ip)
+            print(f"✅ LIVE: {ip}")
+        
+        asyncio.run(self.discover(report))
+    
+    async def port_open(self, target, port, timeout=1):
+        await self.apace()
+        self.probes += 1
+        try:
+            _, writer = await self.connect(target, port, timeout)
+        except (asyncio.TimeoutError, OSError):
+            return False
+        writer.close()
+        print(f"  🟢 {target}:{port} ({self.get_service_name(port)})")
+        return True
+    
+    async def scan_ports(self, target, ports=PORTS):
+        """Open ports of `target`, probing them all at once in random order"""
+        ports = random.sample(ports, len(ports))
+        answers = await asyncio.gather(*(self.port_open(target, port) for port in ports))
+        return sorted(port for port, is_open in zip(ports, answers) if is_open)
     
     def get_service_name(self, port):
         """Map ports to common services"""
@@ -55,7 +328,41 @@ class NetworkScanner:
         }
         return services.get(port, "Unknown")
     
-    def check_vulnerabilities(self, ip, open_ports):
+    # Probes for services that wait for the client to speak; the rest
+    # (SSH, FTP, SMTP, MySQL...) send a greeting on connect
+    PROBES = {80: b"HEAD / HTTP/1.0\r\n\r\n", 6379: b"PING\r\n", 8080: b"HEAD / HTTP/1.0\r\n\r\n"}
+    
+    async def grab_banner(self, ip, port, timeout=2):
+        """Read a service's greeting, or its answer to a protocol probe"""
+        try:
+            reader, writer = await self.connect(ip, port, timeout)
+        except (asyncio.TimeoutError, OSError):
+            return ""
+        try:
+            probe = self.PROBES.get(port, b"")
+            if probe:
+                writer.write(probe)
+            try:
+                banner = await asyncio.wait_for(reader.read(1024), timeout)
+            except (asyncio.TimeoutError, OSError):
+                banner = b""
+            if not banner and probe == b"":
+                # Silent on connect: try HTTP, the most common unknown
+                writer.write(self.PROBES[80])
+                try:
+                    banner = await asyncio.wait_for(reader.read(1024), timeout)
+                except (asyncio.TimeoutError, OSError):
+                    pass
+            return banner.decode(errors="replace").strip()
+        finally:
+            writer.close()
+    
+    async def grab_banners(self, ip, open_ports):
+        """Banners for all open ports at once, {port: banner}"""
+        banners = await asyncio.gather(*(self.grab_banner(ip, port) for port in open_ports))
+        return dict(zip(open_ports, banners))
+    
+    def check_vulnerabilities(self, ip, open_ports, banners=None):
         """Basic vulnerability checks"""
         vulns = []
         
@@ -65,24 +372,106 @@ class NetworkScanner:
             if port in dangerous:
                 vulns.append(f"🚨 DANGEROUS PORT {port} OPEN")
         
-        # Banner grabbing (like netcat)
-        if 80 in open_ports or 8080 in open_ports:
-            try:
-                sock = socket.socket()
-                sock.settimeout(2)
-                sock.connect((ip, 80))
-                sock.send(b"HEAD / HTTP/1.0\r\n\r\n")
-                banner = sock.recv(1024).decode()
-                sock.close()
+        # Banner grabbing (like netcat), every open port concurrently
+        if banners is None:
+            banners = asyncio.run(self.grab_banners(ip, open_ports))
+        for port, banner in banners.items():
+            if banner.startswith("HTTP/"):
                 if "Apache" in banner:
-                    vulns.append("⚠️ Apache server detected")
+                    vulns.append(f"⚠️ Apache server detected on port {port}")
                 if "nginx" in banner:
-                    vulns.append("⚠️ Nginx server detected")
-            except:
-                pass
+                    vulns.append(f"⚠️ Nginx server detected on port {port}")
+            elif banner.startswith("SSH-1."):
+                vulns.append(f"🚨 Obsolete SSH protocol 1 on port {port}")
+            elif banner.startswith("+PONG"):
+                vulns.append(f"🚨 Redis without authentication on port {port}")
         
         return vulns
     
+    def load_previous(self, path="scan_results.json"):
+        """Last run's devices by IP, for incremental mode"""
+        try:
+            with open(path) as f:
+                devices = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            print(f"⚠️ No previous results in {path}, scanning everything")
+            return
+        for device in devices:
+            device["banners"] = {int(port): banner for port, banner in device.get("banners", {}).items()}
+            self.previous[device["ip"]] = device
+        print(f"♻️ Incremental scan against {len(self.previous)} known devices")
+    
+    def priority(self, ip):
+        """Sort key for known hosts: those that just changed first, the
+        longest-stable last. Addresses not seen before come after all of
+        them, in candidates()' random sweep of the network."""
+        return self.previous[ip].get("stable_scans", 0)
+    
+    def plan_ports(self, ip):
+        """Ports to probe on `ip` this run. Ports open last time are always
+        probed; ports closed on a host that hasn't changed for n runs are
+        sampled every min(n + 1, STABLE_PERIOD) runs, a different share of
+        them each run, and assumed still closed otherwise."""
+        previous = self.previous.get(ip)
+        if previous is None:
+            return self.PORTS
+        period = min(previous.get("stable_scans", 0) + 1, self.STABLE_PERIOD)
+        run = previous.get("scans", 1)
+        return [port for port in self.PORTS
+                if port in previous["open_ports"] or (run + port) % period == 0]
+    
+    def fingerprint(self, banner):
+        """The part of a banner that identifies the service: its first line,
+        plus the Server header for HTTP (Date and the like change every run)"""
+        lines = banner.splitlines()
+        return [line for i, line in enumerate(lines) if i == 0 or line.lower().startswith("server:")]
+    
+    def diff_device(self, previous, device):
+        """What changed on a device since the last run, or None"""
+        before, after = set(previous["open_ports"]), set(device["open_ports"])
+        old, new = previous.get("banners", {}), device["banners"]
+        changed = {port: {"before": old.get(port, ""), "after": new.get(port, "")}
+                   for port in sorted(before & after)
+                   if self.fingerprint(old.get(port, "")) != self.fingerprint(new.get(port, ""))}
+        if before == after and not changed:
+            return None
+        return {"opened": sorted(after - before), "closed": sorted(before - after), "changed_services": changed}
+    
+    def generate_diff(self):
+        """Diff report against the previous run: scan_diff.json"""
+        current = {device["ip"]: device for device in self.results}
+        diff = {
+            "generated_at": datetime.now().isoformat(),
+            "new_hosts": sorted(set(current) - set(self.previous)),
+            "gone_hosts": sorted(ip for ip in set(self.previous) - set(current)
+                                 if ipaddress.IPv4Address(ip) in self.network),
+            "changes": {},
+            "probes": {"sent": self.probes, "full_scan": len(current) * len(self.PORTS)},
+        }
+        for ip in sorted(set(current) & set(self.previous)):
+            changes = self.diff_device(self.previous[ip], current[ip])
+            if changes:
+                diff["changes"][ip] = changes
+        
+        print(f"\n🔀 Since last scan: {len(diff['new_hosts'])} new hosts, {len(diff['gone_hosts'])} gone, "
+              f"{len(diff['changes'])} changed")
+        for ip in diff["new_hosts"]:
+            print(f"  🆕 {ip}: {', '.join(map(str, current[ip]['open_ports'])) or 'no open ports'}")
+        for ip in diff["gone_hosts"]:
+            print(f"  👻 {ip} no longer answering")
+        for ip, changes in diff["changes"].items():
+            for port in changes["opened"]:
+                print(f"  🟢 {ip}:{port} opened")
+            for port in changes["closed"]:
+                print(f"  🔴 {ip}:{port} closed")
+            for port, service in changes["changed_services"].items():
+                print(f"  🔄 {ip}:{port} {service['before'][:40]!r} -> {service['after'][:40]!r}")
+        print(f"📉 Probed {diff['probes']['sent']} of {diff['probes']['full_scan']} ports")
+        
+        with open("scan_diff.json", "w") as f:
+            json.dump(diff, f, indent=2)
+        print("✅ Diff saved: scan_diff.json")
+    
     def dns_lookup(self, ip):
         """Reverse DNS lookup"""
         try:
@@ -91,36 +480,118 @@ class NetworkScanner:
         except:
             return "No DNS"
     
-    def full_scan(self):
+    def full_scan(self, resume=False, incremental=False):
         """Main scanning logic"""
-        self.scan_live_hosts()
-        
-        print(f"\n🔥 Full scan of {len(self.live_hosts)} live devices...")
+        if incremental:
+            self.load_previous()
+        resumed = resume and self.load_checkpoint()
+        if not resumed:
+            self.save_checkpoint()
         
-        for ip in self.live_hosts:
-            print(f"\n📡 Scanning {ip}...")
-            
-            # Port scan
-            open_ports = self.port_scan(ip)
-            
-            # DNS lookup
-            hostname = self.dns_lookup(ip)
-            
-            # Vulnerability check
-            vulns = self.check_vulnerabilities(ip, open_ports)
-            
-            # Store results
-            device = {
-                "ip": ip,
-                "hostname": hostname,
-                "open_ports": open_ports,
-                "vulnerabilities": vulns,
-                "risk_level": self.calculate_risk(open_ports, vulns),
-                "scanned_at": datetime.now().isoformat()
-            }
-            self.results.append(device)
+        print("\n🔍 Discovering live hosts, each scanned as soon as it's found...")
+        stages = asyncio.run(self.pipeline())
         
+        if not self.sweep_done:
+            self.sweep_done = True
+            self.save_checkpoint({"sweep_done": True})
         self.generate_report()
+        if incremental:
+            self.generate_diff()
+        os.remove(self.checkpoint)  # finished: nothing left to resume
+        self.print_stages(*stages)
+    
+    async def pipeline(self):
+        """Discovery -> port scan -> reverse DNS -> banners and vulnerability
+        checks -> recording, each stage with its own workers, so hosts move
+        through at the pace of the slowest stage rather than the sum"""
+        loop = asyncio.get_running_loop()
+        dns_threads = ThreadPoolExecutor(self.DNS_WORKERS)
+        done = {device["ip"] for device in self.results}
+        
+        async def found(ip):
+            if ip not in self.live_hosts:
+                self.live_hosts.append(ip)
+                self.save_checkpoint({"live": ip})
+                print(f"✅ LIVE: {ip}")
+            if ip not in done:
+                done.add(ip)
+                await ports.inbox.put(ip)
+        
+        async def discover(network):
+            for ip in list(self.live_hosts):  # already found before a resume
+                await found(ip)
+            if not self.sweep_done:
+                await self.discover(found)
+        
+        async def scan_ports(ip):
+            return {"ip": ip, "open_ports": await self.scan_ports(ip, self.plan_ports(ip))}
+        
+        async def lookup(device):
+            device["hostname"] = await loop.run_in_executor(dns_threads, self.dns_lookup, device["ip"])
+            return device
+        
+        async def check(device):
+            device["banners"] = await self.grab_banners(device["ip"], device["open_ports"])
+            device["vulnerabilities"] = self.check_vulnerabilities(device["ip"], device["open_ports"],
+                                                                   device["banners"])
+            return device
+        
+        async def record(device):
+            self.record(device)
+        
+        discovery = Stage("discovery", discover, 1)
+        ports = Stage("ports", scan_ports, self.PORT_WORKERS)
+        dns = Stage("dns", lookup, self.DNS_WORKERS)
+        checks = Stage("banners/vulns", check, self.CHECK_WORKERS)
+        recorder = Stage("record", record, 1)
+        stages = [discovery, ports, dns, checks, recorder]
+        for stage, following in zip(stages, stages[1:]):
+            stage.next = following
+        
+        start = time.perf_counter()
+        await discovery.inbox.put(self.network)  # a single sweep
+        await discovery.inbox.put(None)
+        try:
+            await asyncio.gather(*(stage.run() for stage in stages))
+        finally:
+            dns_threads.shutdown(wait=False)
+        return stages, time.perf_counter() - start
+    
+    def record(self, device):
+        """Finish a device: risk, incremental history, results, checkpoint"""
+        ip = device["ip"]
+        device = {
+            "ip": ip,
+            "hostname": device["hostname"],
+            "open_ports": device["open_ports"],
+            "banners": device["banners"],
+            "vulnerabilities": device["vulnerabilities"],
+            "risk_level": self.calculate_risk(device["open_ports"], device["vulnerabilities"]),
+            "scanned_at": datetime.now().isoformat()
+        }
+        previous = self.previous.get(ip)
+        if previous:
+            unchanged = self.diff_device(previous, device) is None
+            device["scans"] = previous.get("scans", 1) + 1
+            device["stable_scans"] = previous.get("stable_scans", 0) + 1 if unchanged else 0
+        else:
+            device["scans"], device["stable_scans"] = 1, 0
+        self.results.append(device)
+        self.save_checkpoint(device)
+        print(f"📡 {ip} ({device['hostname']}): {len(device['open_ports'])} open, risk {device['risk_level']}/10")
+    
+    def print_stages(self, stages, elapsed):
+        """Per-stage throughput: items through (discovery's one item is the
+        whole sweep), failures, rate, time per item, and how busy its
+        workers were (the busiest stage is the bottleneck)"""
+        print(f"\n⏱️ Pipeline finished in {elapsed:.2f}s, {len(self.live_hosts)} live hosts")
+        print(f"  {'stage':14} {'workers':>7} {'items':>6} {'failed':>6} {'per s':>7} {'s/item':>7} {'busy':>5}")
+        for stage in stages:
+            rate = stage.items / elapsed if elapsed else 0
+            per_item = stage.busy / stage.items if stage.items else 0
+            busy = stage.busy / (stage.workers * elapsed) if elapsed else 0
+            print(f"  {stage.name:14} {stage.workers:>7} {stage.items:>6} {stage.failed:>6} {rate:>7.1f} "
+                  f"{per_item:>7.3f} {busy:>5.0%}")
     
     def calculate_risk(self, ports, vulns):
         """Risk scoring logic (0-10)"""
@@ -175,13 +646,17 @@ class NetworkScanner:
         print("✅ JSON saved: scan_results.json")
 
 def main():
-    if len(sys.argv) > 1:
-        network = sys.argv[1]
-    else:
-        network = "192.168.1.0/24"  # Default college WiFi
+    parser = argparse.ArgumentParser(description="Network Security Scanner")
+    parser.add_argument("network", nargs="?", default="192.168.1.0/24")  # Default college WiFi
+    parser.add_argument("--resume", action="store_true", help="continue an interrupted scan from radar_checkpoint.jsonl")
+    parser.add_argument("--incremental", action="store_true",
+                        help="rescan against scan_results.json: changed hosts first, stable closed ports sampled")
+    parser.add_argument("--rate", type=float, help="port probes per second (default unlimited)")
+    parser.add_argument("--jitter", type=float, default=0.3, help="randomize gaps between probes by this fraction")
+    args = parser.parse_args()
     
-    scanner = NetworkScanner(network)
-    scanner.full_scan()
+    scanner = NetworkScanner(args.network, rate=args.rate, jitter=args.jitter)
+    scanner.full_scan(resume=args.resume, incremental=args.incremental)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,9 +1,16 @@
 import http.server
 import socketserver
 import json
+import gzip
 import sqlite3
 import os
+import re
+import time
+import queue
+import logging
 import secrets
+import threading
+from bisect import bisect_left
 from urllib.parse import urlparse, parse_qs
 import hashlib
 
@@ -14,11 +21,92 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_FILE = os.path.join(BASE_DIR, "marketplace.db")
 STATIC_DIR = os.path.join(os.path.dirname(BASE_DIR), "frontend")
 
-# Database Init
-def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.executescript('''
+# Instrumentation
+# Per-route request counters and latency histograms live on each Route (see
+# Routing below) and are exposed in Prometheus text format on /metrics.
+# SQLite time is measured per statement through TimedConnection and summed per
+# request thread; statements slower than SLOW_QUERY_SECONDS are logged.
+logger = logging.getLogger("marketplace")
+SLOW_QUERY_SECONDS = float(os.getenv("SLOW_QUERY_SECONDS", "0.1"))
+
+class Histogram:
+    """Fixed-bucket latency histogram, in seconds."""
+    BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS) + 1)  # last slot is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        i = bisect_left(self.BUCKETS, seconds)
+        with self.lock:
+            self.counts[i] += 1
+            self.count += 1
+            self.total += seconds
+
+    def render(self, name, labels):
+        with self.lock:
+            counts, count, total = list(self.counts), self.count, self.total
+        lines, running = [], 0
+        for bound, n in zip(self.BUCKETS + ('+Inf',), counts):
+            running += n
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {running}')
+        lines.append(f'{name}_sum{{{labels}}} {total}')
+        lines.append(f'{name}_count{{{labels}}} {count}')
+        return lines
+
+request_stats = threading.local()  # .db_time for the request on this thread
+slow_queries = 0
+counter_lock = threading.Lock()  # guards slow_queries and Router.misses
+
+def record_db_time(sql, seconds, before=0.0):
+    # `before` is time already spent on the same statement (earlier fetches),
+    # so a slow query is logged once, when its total first crosses the limit
+    global slow_queries
+    request_stats.db_time = getattr(request_stats, 'db_time', 0.0) + seconds
+    if before < SLOW_QUERY_SECONDS <= before + seconds:
+        with counter_lock:
+            slow_queries += 1
+        logger.warning("Slow query (%.1f ms): %s", (before + seconds) * 1000, " ".join(sql.split()))
+
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, sql, params=()):
+        self.sql, self.elapsed = sql, 0.0
+        return self.timed(super().execute, sql, params)
+
+    def fetchone(self):
+        return self.timed(super().fetchone)
+
+    def fetchall(self):
+        return self.timed(super().fetchall)
+
+    def timed(self, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            took = time.perf_counter() - start
+            record_db_time(self.sql, took, self.elapsed)
+            self.elapsed += took
+
+class TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+def connect(db_file=None, **kwargs):
+    return sqlite3.connect(db_file or DB_FILE, factory=TimedConnection, **kwargs)
+
+# Schema migrations
+# The schema version lives in PRAGMA user_version. Each migration moves it up
+# by one and runs in its own transaction together with the version bump, so a
+# failed step leaves the database at the previous version.
+def m001_base_schema(c):
+    c.execute('''
         CREATE TABLE IF NOT EXISTS users (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             name TEXT NOT NULL,
@@ -27,7 +115,8 @@ def init_db():
             role TEXT DEFAULT 'buyer',
             location TEXT,
             phone TEXT
-        );
+        )''')
+    c.execute('''
         CREATE TABLE IF NOT EXISTS listings (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             seller_id INTEGER,
@@ -44,7 +133,8 @@ def init_db():
             photos TEXT,
             created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY(seller_id) REFERENCES users(id)
-        );
+        )''')
+    c.execute('''
         CREATE TABLE IF NOT EXISTS buy_requests (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             listing_id INTEGER,
@@ -53,27 +143,354 @@ def init_db():
             status TEXT DEFAULT 'pending',
             created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY(listing_id) REFERENCES listings(id)
-        );
-    ''')
-    
-    # Migration: Add phone column if it doesn't exist (for existing DBs)
-    try:
+        )''')
+
+def m002_users_phone(c):
+    # Databases created before phone was part of the users table
+    columns = [row[1] for row in c.execute("PRAGMA table_info(users)")]
+    if 'phone' not in columns:
         c.execute("ALTER TABLE users ADD COLUMN phone TEXT")
-    except sqlite3.OperationalError:
-        pass # Column likely exists
+
+def m003_indexes(c):
+    c.execute("CREATE INDEX IF NOT EXISTS ix_listings_status_created ON listings(status, created_at)")
+    c.execute("CREATE INDEX IF NOT EXISTS ix_listings_seller ON listings(seller_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS ix_buy_requests_buyer ON buy_requests(buyer_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS ix_buy_requests_seller ON buy_requests(seller_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS ix_buy_requests_listing ON buy_requests(listing_id)")
+
+def m004_photos_json(c):
+    # photos must always hold a valid JSON array so json(photos) can embed it
+    c.execute("UPDATE listings SET photos='[]' WHERE photos IS NULL OR NOT json_valid(photos)")
+
+MIGRATIONS = [m001_base_schema, m002_users_phone, m003_indexes, m004_photos_json]
+
+def migrate(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for target, step in enumerate(MIGRATIONS[version:], start=version + 1):
+        logger.info("Migrating database to version %d (%s)", target, step.__name__)
+        conn.execute("BEGIN")
+        try:
+            step(conn)
+            conn.execute(f"PRAGMA user_version={target}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+# Database Init
+def init_db():
+    conn = sqlite3.connect(DB_FILE, isolation_level=None)
+    migrate(conn)
+    c = conn.cursor()
 
     # Check if admin exists
     c.execute("SELECT id FROM users WHERE role='admin'")
     if not c.fetchone():
-        print("Creating default admin user...")
+        logger.info("Creating default admin user...")
         pwd_hash = hashlib.sha256("admin123".encode()).hexdigest()
         c.execute("INSERT INTO users (name, email, password_hash, role, location, phone) VALUES (?, ?, ?, ?, ?, ?)",
                   ("Administrator", "admin@example.com", pwd_hash, "admin", "HQ", "0000000000"))
-        print("Default admin created: admin@example.com / admin123")
-    
-    conn.commit()
+        logger.info("Default admin created: admin@example.com / admin123")
+
     conn.close()
 
+# Write batching
+# All inserts/updates go through one background thread that owns the write
+# connection. It drains whatever jobs have queued up within a short window and
+# commits them together, so a burst of N writes costs one fsync instead of N.
+# Each job runs inside its own SAVEPOINT, so a failing job (e.g. a duplicate
+# email) is rolled back alone and reported back to its caller.
+class WriteJob:
+    def __init__(self, sql, params):
+        self.sql = sql
+        self.params = params
+        self.lastrowid = None
+        self.rowcount = None
+        self.error = None
+        self.done = threading.Event()
+
+class WriteQueue:
+    def __init__(self, max_batch=256, max_delay=0.002, timeout=30.0):
+        self.max_batch = max_batch
+        self.max_delay = max_delay  # seconds to wait for more jobs after the first
+        self.timeout = timeout  # a caller gives up (500) rather than hang on a stuck writer
+        self.jobs = queue.Queue()
+        self.thread = None
+
+    def start(self, db_file):
+        self.db_file = db_file
+        self.thread = threading.Thread(target=self.run, name="db-writer", daemon=True)
+        self.thread.start()
+
+    def execute(self, sql, params=()):
+        """Queue a write and block until its batch commits. Returns the job."""
+        job = WriteJob(sql, params)
+        start = time.perf_counter()
+        self.jobs.put(job)
+        if not job.done.wait(self.timeout):
+            raise RuntimeError(f"Database writer gave no answer within {self.timeout:g}s")
+        record_db_time(sql, time.perf_counter() - start)
+        if job.error:
+            raise job.error
+        return job
+
+    def next_batch(self):
+        batch = [self.jobs.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self.jobs.get(timeout=max(deadline - time.monotonic(), 0)))
+            except queue.Empty:
+                break
+        return batch
+
+    def connect(self):
+        # isolation_level=None: transactions are managed explicitly below
+        conn = sqlite3.connect(self.db_file, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")  # readers don't block on the writer
+        return conn
+
+    def run(self):
+        conn = self.connect()
+        while True:
+            batch = self.next_batch()
+            try:
+                self.commit(conn, batch)
+            except Exception as e:
+                # The whole batch is lost (disk full, I/O error, ...); fail
+                # its jobs and carry on with the next one
+                logger.exception("Write batch of %d jobs failed", len(batch))
+                for job in batch:
+                    job.error = job.error or e
+                conn = self.recover(conn)
+            finally:
+                for job in batch:
+                    job.done.set()
+
+    def commit(self, conn, batch):
+        conn.execute("BEGIN")
+        for job in batch:
+            conn.execute("SAVEPOINT job")
+            try:
+                c = conn.execute(job.sql, job.params)
+                job.lastrowid, job.rowcount = c.lastrowid, c.rowcount
+                conn.execute("RELEASE job")
+            except Exception as e:
+                if not conn.in_transaction:  # SQLite rolled the whole batch back
+                    raise
+                conn.execute("ROLLBACK TO job")
+                conn.execute("RELEASE job")
+                job.error = e
+        conn.execute("COMMIT")
+
+    def recover(self, conn):
+        # After some errors SQLite has already rolled back, and a plain
+        # ROLLBACK would raise; a connection that can't roll back is replaced
+        try:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            return conn
+        except sqlite3.Error:
+            logger.exception("Reopening the write connection")
+        conn.close()
+        try:
+            return self.connect()
+        except sqlite3.Error:
+            logger.exception("Write connection unavailable, retrying with the next batch")
+            return conn  # closed: the next batch fails fast and lands back here
+
+writer = WriteQueue()
+
+# Listing catalogue snapshot
+# The landing page asks for the active listings (/listings/?status=active) far
+# more often than they change, so keep that response body pre-serialized (and
+# pre-gzipped) in memory. Each active listing is encoded once into a JSON
+# fragment; a write only re-encodes the affected row and re-joins the fragments.
+# Responses are assembled as JSON text by SQLite itself (json_object /
+# json_group_array), so list endpoints never build Python dicts per row.
+LISTING_JSON = '''json_object(
+    'id', id, 'seller_id', seller_id, 'title', title, 'category', category,
+    'brand', brand, 'model', model, 'condition', condition, 'price', price,
+    'location', location, 'description', description, 'status', status,
+    'working_parts', working_parts, 'photos', json(photos), 'created_at', created_at)'''
+
+REQUEST_JSON = '''json_object(
+    'id', br.id, 'listing_id', br.listing_id, 'buyer_id', br.buyer_id,
+    'seller_id', br.seller_id, 'status', br.status, 'created_at', br.created_at)'''
+
+# json_group_array only keeps an order given to the aggregate itself (SQLite
+# 3.44+); a subquery's ORDER BY doesn't bind it. Older libraries get the
+# ordered items joined in Python instead.
+AGGREGATE_ORDER_BY = sqlite3.sqlite_version_info >= (3, 44, 0)
+
+def json_array(conn, select, args=(), order_by=None):
+    """JSON array text of the `item` column of `select`, in `order_by` order"""
+    if order_by is None:
+        # JSON subtypes don't survive a subquery, hence json() around each item
+        return conn.execute(f"SELECT json_group_array(json(item)) FROM ({select})", args).fetchone()[0]
+    if AGGREGATE_ORDER_BY:
+        return conn.execute(f"SELECT json_group_array(json(item) ORDER BY {order_by}) FROM ({select})",
+                            args).fetchone()[0]
+    rows = conn.execute(f"{select} ORDER BY {order_by}", args).fetchall()
+    return '[' + ','.join(row[0] for row in rows) + ']'
+
+class CatalogueSnapshot:
+    def __init__(self):
+        self.fragments = {}  # listing id -> encoded JSON object
+        self.encoded = (b'[]', gzip.compress(b'[]', mtime=0))  # (plain, gzipped)
+        self.lock = threading.Lock()
+
+    def load(self, db_file):
+        conn = connect(db_file)
+        rows = conn.execute(f"SELECT id, {LISTING_JSON} FROM listings WHERE status='active'").fetchall()
+        conn.close()
+        with self.lock:
+            self.fragments = {lid: item.encode() for lid, item in rows}
+            self.rebuild()
+
+    def refresh(self, db_file, listing_id):
+        """Re-read one listing after it was inserted or its status changed."""
+        conn = connect(db_file)
+        row = conn.execute(f"SELECT status, {LISTING_JSON} FROM listings WHERE id=?", (listing_id,)).fetchone()
+        conn.close()
+        with self.lock:
+            if row and row[0] == 'active':
+                self.fragments[listing_id] = row[1].encode()
+            elif self.fragments.pop(listing_id, None) is None:
+                return
+            self.rebuild()
+
+    def rebuild(self):
+        # Newest first; ids grow with created_at
+        body = b'[' + b', '.join(self.fragments[i] for i in sorted(self.fragments, reverse=True)) + b']'
+        # Swapped as one tuple so readers never see a mismatched pair
+        self.encoded = (body, gzip.compress(body, compresslevel=6, mtime=0))
+
+catalogue = CatalogueSnapshot()
+
+# Routing
+# Each route is registered with a method and a path pattern such as
+# "/requests/<int:req_id>/<action>". Plain paths live in a dict; patterns
+# with params are folded into one alternation regex per method, so a lookup
+# costs one dict probe plus at most one regex match however many routes exist.
+PARAM_TYPES = {
+    'int': (r'\d+', int),
+    'str': (r'[^/]+', str),
+    'path': (r'.+', str),
+}
+PARAM_RE = re.compile(r'<(?:(\w+):)?(\w+)>')
+
+class Route:
+    def __init__(self, method, pattern, func):
+        self.method = method
+        self.pattern = pattern
+        self.func = func
+        self.timing = Histogram()
+        self.db_timing = Histogram()
+        self.responses = {}  # status code -> count
+        self.lock = threading.Lock()
+        # Split the pattern into literal chunks and (kind, name) params
+        self.chunks, self.params = [], []
+        pos = 0
+        for m in PARAM_RE.finditer(pattern):
+            self.chunks.append(pattern[pos:m.start()])
+            self.params.append((m.group(1) or 'str', m.group(2)))
+            pos = m.end()
+        self.chunks.append(pattern[pos:])
+
+    def regex(self, group):
+        # Params are named "<group>_<name>" so they stay unique inside the
+        # per-method alternation
+        out = [re.escape(self.chunks[0])]
+        for (kind, name), chunk in zip(self.params, self.chunks[1:]):
+            out.append(f'(?P<{group}_{name}>{PARAM_TYPES[kind][0]})')
+            out.append(re.escape(chunk))
+        return f'(?P<{group}>{"".join(out)})'
+
+    def record(self, status, seconds, db_seconds):
+        self.timing.observe(seconds)
+        self.db_timing.observe(db_seconds)
+        with self.lock:
+            self.responses[status] = self.responses.get(status, 0) + 1
+
+    def convert(self, m, group):
+        return {name: PARAM_TYPES[kind][1](m.group(f'{group}_{name}')) for kind, name in self.params}
+
+class Router:
+    def __init__(self):
+        self.static = {}    # (method, path) -> Route
+        self.dynamic = {}   # method -> [Route]
+        self.compiled = {}  # method -> compiled alternation regex
+        self.misses = 0     # requests that matched no route
+
+    def add(self, method, pattern, func):
+        route = Route(method, pattern, func)
+        if not route.params:
+            self.static[(method, pattern)] = route
+            return route
+        routes = self.dynamic.setdefault(method, [])
+        routes.append(route)
+        alternation = '|'.join(r.regex(f'r{i}') for i, r in enumerate(routes))
+        self.compiled[method] = re.compile(f'(?:{alternation})\\Z')
+        return route
+
+    def route(self, method, pattern):
+        def decorator(func):
+            self.add(method, pattern, func)
+            return func
+        return decorator
+
+    def get(self, pattern):
+        return self.route('GET', pattern)
+
+    def post(self, pattern):
+        return self.route('POST', pattern)
+
+    def put(self, pattern):
+        return self.route('PUT', pattern)
+
+    def match(self, method, path):
+        route = self.static.get((method, path))
+        if route:
+            return route, {}
+        regex = self.compiled.get(method)
+        m = regex.match(path) if regex else None
+        if not m:
+            return None, None
+        # The outermost group closes last, so lastgroup names the route
+        group = m.lastgroup
+        route = self.dynamic[method][int(group[1:])]
+        return route, route.convert(m, group)
+
+    def routes(self):
+        routes = list(self.static.values())
+        for rs in self.dynamic.values():
+            routes.extend(rs)
+        return routes
+
+    def render_metrics(self):
+        out = ['# HELP marketplace_requests_total Requests handled, by route and status.',
+               '# TYPE marketplace_requests_total counter']
+        for r in self.routes():
+            with r.lock:
+                responses = sorted(r.responses.items())
+            for status, n in responses:
+                out.append(f'marketplace_requests_total{{method="{r.method}",route="{r.pattern}",status="{status}"}} {n}')
+        out.append(f'marketplace_requests_total{{method="",route="",status="404"}} {self.misses}')
+        for name, attr, help_text in (
+                ('marketplace_request_duration_seconds', 'timing', 'Time spent handling the request.'),
+                ('marketplace_request_db_seconds', 'db_timing', 'SQLite time (queries and queued writes) per request.')):
+            out.append(f'# HELP {name} {help_text}')
+            out.append(f'# TYPE {name} histogram')
+            for r in self.routes():
+                out.extend(getattr(r, attr).render(name, f'method="{r.method}",route="{r.pattern}"'))
+        out.append('# HELP marketplace_slow_queries_total Statements slower than the slow-query threshold.')
+        out.append('# TYPE marketplace_slow_queries_total counter')
+        out.append(f'marketplace_slow_queries_total {slow_queries}')
+        return '\n'.join(out) + '\n'
+
+router = Router()
+
 class MarketplaceHandler(http.server.SimpleHTTPRequestHandler):
     def end_headers(self):
         self.send_header('Access-Control-Allow-Origin', '*')
@@ -92,204 +509,236 @@ class MarketplaceHandler(http.server.SimpleHTTPRequestHandler):
         self.wfile.write(json.dumps({'detail': message}).encode())
 
     def do_GET(self):
-        parsed = urlparse(self.path)
-        path = parsed.path
-        
-        # Static Files serving from /static
-        if path.startswith("/static/"):
-            # Rewriting path to serve from frontend dir
-            relative_path = path.replace("/static/", "")
-            file_path = os.path.join(STATIC_DIR, relative_path)
-            if os.path.exists(file_path):
-                self.send_response(200)
-                # Guess mimetype
-                if file_path.endswith(".html"): self.send_header('Content-type', 'text/html')
-                elif file_path.endswith(".js"): self.send_header('Content-type', 'application/javascript')
-                elif file_path.endswith(".css"): self.send_header('Content-type', 'text/css')
-                self.end_headers()
-                with open(file_path, 'rb') as f:
-                    self.wfile.write(f.read())
-                return
-            else:
-                self.send_error(404, "File not found")
-                return
-        
-        # Root -> Index
-        if path == "/":
-            self.send_response(301)
-            self.send_header('Location', '/static/index.html')
-            self.end_headers()
-            return
+        self.dispatch('GET')
 
-        # API: Get Listings
-        if path == "/listings/":
-            conn = sqlite3.connect(DB_FILE)
-            conn.row_factory = sqlite3.Row
-            c = conn.cursor()
-            c.execute("SELECT * FROM listings ORDER BY created_at DESC")
-            listings = [dict(row) for row in c.fetchall()]
-            # Add photos array (fake for now or parsed)
-            for l in listings:
-                l['photos'] = json.loads(l['photos']) if l['photos'] else []
-            conn.close()
-            self.send_json(listings)
-            return
-            
-        # API: My Requests
-        if path == "/requests/my-requests":
-            user = self.get_user_from_token()
-            if not user: return
-            conn = sqlite3.connect(DB_FILE)
-            conn.row_factory = sqlite3.Row
-            c = conn.cursor()
-            c.execute("SELECT * FROM buy_requests WHERE buyer_id=?", (user['id'],))
-            requests = [dict(row) for row in c.fetchall()]
-            conn.close()
-            self.send_json(requests)
-            return
+    def do_POST(self):
+        self.dispatch('POST')
 
-        # API: Incoming Requests
-        if path == "/requests/incoming":
-            user = self.get_user_from_token()
-            if not user: return
-            conn = sqlite3.connect(DB_FILE)
-            conn.row_factory = sqlite3.Row
-            c = conn.cursor()
-            # Join with users to get buyer info
-            c.execute('''
-                SELECT br.*, u.name as buyer_name, u.email as buyer_email, u.phone as buyer_phone, u.location as buyer_location
-                FROM buy_requests br
-                JOIN users u ON br.buyer_id = u.id
-                WHERE br.seller_id=?
-            ''', (user['id'],))
-            requests = [dict(row) for row in c.fetchall()]
-            conn.close()
-            self.send_json(requests)
+    def do_PUT(self):
+        self.dispatch('PUT')
+
+    def dispatch(self, method):
+        path = urlparse(self.path).path
+        route, params = router.match(method, path)
+        if not route:
+            with counter_lock:
+                router.misses += 1
+            self.send_error(404, "Not found")
             return
-            
-        # API: Auth Me
-        if path == "/auth/me":
-            user = self.get_user_from_token()
-            if not user: return
-            self.send_json(user)
+        request_stats.db_time = 0.0
+        self.status_code = None
+        start = time.perf_counter()
+        try:
+            route.func(self, **params)
+        except Exception as e:
+            logger.exception("Server Error in %s %s", method, path)
+            self.send_error(500, str(e))
+        finally:
+            route.record(self.status_code, time.perf_counter() - start, request_stats.db_time)
+
+    def send_response(self, code, message=None):
+        self.status_code = code
+        super().send_response(code, message)
+
+    def log_message(self, format, *args):
+        logger.info("%s - %s", self.address_string(), format % args)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length'))
+        return json.loads(self.rfile.read(length))
+
+    # Static Files serving from /static
+    @router.get("/static/<path:relative_path>")
+    def static_file(self, relative_path):
+        # Rewriting path to serve from frontend dir
+        file_path = os.path.join(STATIC_DIR, relative_path)
+        if os.path.exists(file_path):
+            self.send_response(200)
+            # Guess mimetype
+            if file_path.endswith(".html"): self.send_header('Content-type', 'text/html')
+            elif file_path.endswith(".js"): self.send_header('Content-type', 'application/javascript')
+            elif file_path.endswith(".css"): self.send_header('Content-type', 'text/css')
+            self.end_headers()
+            with open(file_path, 'rb') as f:
+                self.wfile.write(f.read())
+        else:
+            self.send_error(404, "File not found")
+
+    # Root -> Index
+    @router.get("/")
+    def index(self):
+        self.send_response(301)
+        self.send_header('Location', '/static/index.html')
+        self.end_headers()
+
+    # API: Get Listings
+    @router.get("/listings/")
+    def get_listings(self):
+        query = parse_qs(urlparse(self.path).query)
+        if query == {'status': ['active']}:
+            self.send_catalogue()
             return
+        # Everything else hits the DB; without ?status= that is every listing,
+        # sold and expired ones included
+        sql, args = f"SELECT {LISTING_JSON} AS item, created_at FROM listings WHERE 1=1", []
+        for field in ('status', 'category', 'condition'):
+            if field in query:
+                sql += f" AND {field}=?"
+                args.append(query[field][0])
+        conn = connect()
+        listings = json_array(conn, sql, args, order_by="created_at DESC")
+        conn.close()
+        self.send_json_text(listings)
 
-        self.send_error(404)
+    def send_catalogue(self):
+        body, gzipped = catalogue.encoded
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzipped
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Vary', 'Accept-Encoding')
+        self.end_headers()
+        self.wfile.write(body)
 
-    def do_POST(self):
-        try:
-            length = int(self.headers.get('Content-Length'))
-            body = json.loads(self.rfile.read(length))
-            parsed = urlparse(self.path)
-            path = parsed.path
-
-            # API: Login
-            if path == "/auth/login":
-                conn = sqlite3.connect(DB_FILE)
-                conn.row_factory = sqlite3.Row
-                c = conn.cursor()
-                pwd_hash = hashlib.sha256(body['password'].encode()).hexdigest()
-                c.execute("SELECT * FROM users WHERE email=? AND password_hash=?", (body['email'], pwd_hash))
-                user = c.fetchone()
-                conn.close()
-                
-                if user:
-                    token = f"{user['id']}:{secrets.token_hex(16)}"
-                    user_dict = dict(user)
-                    del user_dict['password_hash']
-                    self.send_json({"access_token": token, "user": user_dict})
-                else:
-                    self.send_error(401, "Invalid credentials")
-                return
+    # API: My Requests
+    @router.get("/requests/my-requests")
+    def my_requests(self):
+        user = self.get_user_from_token()
+        if not user: return
+        conn = connect()
+        requests = json_array(conn, f"SELECT {REQUEST_JSON} AS item FROM buy_requests br WHERE br.buyer_id=?",
+                              (user['id'],))
+        conn.close()
+        self.send_json_text(requests)
 
-            # API: Register
-            if path == "/auth/register":
-                conn = sqlite3.connect(DB_FILE)
-                c = conn.cursor()
-                pwd_hash = hashlib.sha256(body['password'].encode()).hexdigest()
-                try:
-                    c.execute("INSERT INTO users (name, email, password_hash, role, location, phone) VALUES (?, ?, ?, ?, ?, ?)",
-                              (body['name'], body['email'], pwd_hash, body['role'], body['location'], body.get('phone', '')))
-                    conn.commit()
-                    user_id = c.lastrowid
-                    conn.close()
-                    token = f"{user_id}:{secrets.token_hex(16)}"
-                    self.send_json({"access_token": token, "user": {**body, "id": user_id, "password": ""}})
-                except sqlite3.IntegrityError:
-                    self.send_error(400, "Email already exists")
-                except Exception as e:
-                    print(f"Registration Error: {e}")
-                    self.send_error(500, f"Registration failed: {str(e)}")
-                return
+    # API: Incoming Requests
+    @router.get("/requests/incoming")
+    def incoming_requests(self):
+        user = self.get_user_from_token()
+        if not user: return
+        conn = connect()
+        # Join with users to get buyer info
+        requests = json_array(conn, f'''
+            SELECT json_object(
+                'id', br.id, 'listing_id', br.listing_id, 'buyer_id', br.buyer_id,
+                'seller_id', br.seller_id, 'status', br.status, 'created_at', br.created_at,
+                'buyer_name', u.name, 'buyer_email', u.email,
+                'buyer_phone', u.phone, 'buyer_location', u.location) AS item
+            FROM buy_requests br
+            JOIN users u ON br.buyer_id = u.id
+            WHERE br.seller_id=?
+        ''', (user['id'],))
+        conn.close()
+        self.send_json_text(requests)
 
-            # API: Create Listing
-            if path == "/listings/":
-                user = self.get_user_from_token()
-                if not user: return
-                conn = sqlite3.connect(DB_FILE)
-                c = conn.cursor()
-                c.execute('''INSERT INTO listings (seller_id, title, category, brand, model, condition, price, location, description, working_parts, photos)
-                             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                          (user['id'], body['title'], body['category'], body['brand'], body['model'], 
-                           body['condition'], body['price'], body['location'], body['description'], 
-                           body['working_parts'], json.dumps(body['photos'])))
-                conn.commit()
-                lid = c.lastrowid
-                conn.close()
-                self.send_json({"id": lid, "status": "active"})
-                return
+    # Prometheus metrics
+    @router.get("/metrics")
+    def metrics(self):
+        body = router.render_metrics().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
 
-            # API: Create Request
-            if path == "/requests/":
-                user = self.get_user_from_token()
-                if not user: return
-                conn = sqlite3.connect(DB_FILE)
-                c = conn.cursor()
-                c.execute("SELECT seller_id FROM listings WHERE id=?", (body['listing_id'],))
-                listing = c.fetchone()
-                if not listing:
-                    self.send_error(404, "Listing not found")
-                    return
-                
-                c.execute("INSERT INTO buy_requests (listing_id, buyer_id, seller_id) VALUES (?, ?, ?)",
-                          (body['listing_id'], user['id'], listing[0]))
-                conn.commit()
-                rid = c.lastrowid
-                conn.close()
-                self.send_json({"id": rid, "status": "pending"})
-                return
+    # API: Auth Me
+    @router.get("/auth/me")
+    def auth_me(self):
+        user = self.get_user_from_token()
+        if not user: return
+        self.send_json(user)
+
+    # API: Login
+    @router.post("/auth/login")
+    def login(self):
+        body = self.read_json()
+        conn = connect()
+        conn.row_factory = sqlite3.Row
+        c = conn.cursor()
+        pwd_hash = hashlib.sha256(body['password'].encode()).hexdigest()
+        c.execute("SELECT * FROM users WHERE email=? AND password_hash=?", (body['email'], pwd_hash))
+        user = c.fetchone()
+        conn.close()
 
+        if user:
+            token = f"{user['id']}:{secrets.token_hex(16)}"
+            user_dict = dict(user)
+            del user_dict['password_hash']
+            self.send_json({"access_token": token, "user": user_dict})
+        else:
+            self.send_error(401, "Invalid credentials")
+
+    # API: Register
+    @router.post("/auth/register")
+    def register(self):
+        body = self.read_json()
+        pwd_hash = hashlib.sha256(body['password'].encode()).hexdigest()
+        try:
+            user_id = writer.execute("INSERT INTO users (name, email, password_hash, role, location, phone) VALUES (?, ?, ?, ?, ?, ?)",
+                                     (body['name'], body['email'], pwd_hash, body['role'], body['location'], body.get('phone', ''))).lastrowid
+            token = f"{user_id}:{secrets.token_hex(16)}"
+            self.send_json({"access_token": token, "user": {**body, "id": user_id, "password": ""}})
+        except sqlite3.IntegrityError:
+            self.send_error(400, "Email already exists")
         except Exception as e:
-            print(f"Server Error: {e}")
-            self.send_error(500, str(e))
+            logger.exception("Registration Error")
+            self.send_error(500, f"Registration failed: {str(e)}")
 
-    def do_PUT(self):
-        parsed = urlparse(self.path)
-        path = parsed.path
-        
-        # API: Accept/Reject Request
-        if path.startswith("/requests/"):
-            user = self.get_user_from_token()
-            if not user: return
-            parts = path.strip("/").split("/")
-            req_id = int(parts[1])
-            action = parts[2] # accept/reject
-            
-            status = "accepted" if action == "accept" else "rejected"
-            
-            conn = sqlite3.connect(DB_FILE)
-            c = conn.cursor()
-            c.execute("UPDATE buy_requests SET status=? WHERE id=?", (status, req_id))
-            conn.commit()
-            conn.close()
-            self.send_json({"id": req_id, "status": status})
+    # API: Create Listing
+    @router.post("/listings/")
+    def create_listing(self):
+        body = self.read_json()
+        user = self.get_user_from_token()
+        if not user: return
+        lid = writer.execute('''INSERT INTO listings (seller_id, title, category, brand, model, condition, price, location, description, working_parts, photos)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                             (user['id'], body['title'], body['category'], body['brand'], body['model'],
+                              body['condition'], body['price'], body['location'], body['description'],
+                              body['working_parts'], json.dumps(body['photos']))).lastrowid
+        catalogue.refresh(DB_FILE, lid)
+        self.send_json({"id": lid, "status": "active"})
+
+    # API: Create Request
+    @router.post("/requests/")
+    def create_request(self):
+        body = self.read_json()
+        user = self.get_user_from_token()
+        if not user: return
+        conn = connect()
+        c = conn.cursor()
+        c.execute("SELECT seller_id FROM listings WHERE id=?", (body['listing_id'],))
+        listing = c.fetchone()
+        conn.close()
+        if not listing:
+            self.send_error(404, "Listing not found")
             return
 
+        rid = writer.execute("INSERT INTO buy_requests (listing_id, buyer_id, seller_id) VALUES (?, ?, ?)",
+                             (body['listing_id'], user['id'], listing[0])).lastrowid
+        self.send_json({"id": rid, "status": "pending"})
+
+    # API: Accept/Reject Request
+    @router.put("/requests/<int:req_id>/<action>")
+    def update_request(self, req_id, action):
+        user = self.get_user_from_token()
+        if not user: return
+
+        status = "accepted" if action == "accept" else "rejected"
+
+        writer.execute("UPDATE buy_requests SET status=? WHERE id=?", (status, req_id))
+        self.send_json({"id": req_id, "status": status})
+
     def send_json(self, data):
+        self.send_json_text(json.dumps(data))
+
+    def send_json_text(self, text):
+        # For bodies that are already JSON (e.g. built by SQLite)
         self.send_response(200)
         self.send_header('Content-Type', 'application/json')
         self.end_headers()
-        self.wfile.write(json.dumps(data).encode())
+        self.wfile.write(text.encode())
 
     def get_user_from_token(self):
         auth_header = self.headers.get('Authorization')
@@ -299,7 +748,7 @@ class MarketplaceHandler(http.server.SimpleHTTPRequestHandler):
         token = auth_header.split(" ")[1]
         try:
             user_id = int(token.split(":")[0])
-            conn = sqlite3.connect(DB_FILE)
+            conn = connect()
             conn.row_factory = sqlite3.Row
             c = conn.cursor()
             c.execute("SELECT * FROM users WHERE id=?", (user_id,))
@@ -313,9 +762,17 @@ class MarketplaceHandler(http.server.SimpleHTTPRequestHandler):
             self.send_error(401, "Invalid Token")
             return None
 
+# Threaded so concurrent writes can share a commit in the writer
+class MarketplaceServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    request_queue_size = 128  # default listen backlog of 5 resets bursts
+
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
     init_db()
+    writer.start(DB_FILE)
+    catalogue.load(DB_FILE)
     # os.chdir(os.path.dirname(os.path.abspath(__file__))) - Removed to avoid CWD confusion
-    server = socketserver.TCPServer(("", PORT), MarketplaceHandler)
-    print(f"Serving at http://localhost:{PORT}")
+    server = MarketplaceServer(("", PORT), MarketplaceHandler)
+    logger.info("Serving at http://localhost:%d", PORT)
     server.serve_forever()
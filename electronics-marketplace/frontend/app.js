@@ -178,7 +178,7 @@ const HomePage = ({ setPage }) => {
 
     const fetchListings = async () => {
         try {
-            const params = {};
+            const params = { status: 'active' };
             if (filters.category) params.category = filters.category;
             if (filters.condition) params.condition = filters.condition;
 
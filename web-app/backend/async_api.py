@@ -0,0 +1,230 @@
+from fastapi import APIRouter, Depends, HTTPException, Response, Query
+from fastapi.security import HTTPAuthorizationCredentials
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.exc import StaleDataError
+from typing import List, Optional
+from datetime import datetime
+
+from database import get_async_db
+from models import User, Listing, BuyRequest, UserRole, ListingStatus, BuyRequestStatus
+from schemas import (
+    UserCreate, UserLogin, UserResponse, Token,
+    ListingCreate, ListingUpdate, ListingResponse,
+    BuyRequestCreate, BuyRequestUpdate, BuyRequestResponse, BuyRequestDetail,
+    dump_listings
+)
+from auth import get_password_hash, verify_password, get_token_user_id, credentials_exception, security
+from ratelimit import auth_limit
+import queries
+import service
+import stats
+import jobs
+
+# Async versions of the handlers in main.py, mounted when
+# settings.ASYNC_DATABASE is on. They run on the event loop against the async
+# engine, so concurrent requests don't compete for threadpool slots; only
+# bcrypt (CPU-bound) is pushed to the threadpool.
+router = APIRouter()
+
+async def get_current_user_async(credentials: HTTPAuthorizationCredentials = Depends(security), db: AsyncSession = Depends(get_async_db)):
+    user_id = get_token_user_id(credentials)
+    user = (await db.scalars(queries.user_by_id(user_id))).first()
+    if user is None:
+        raise credentials_exception
+    return user
+
+def require_role_async(allowed_roles: list):
+    async def role_checker(current_user: User = Depends(get_current_user_async)):
+        if current_user.role not in allowed_roles:
+            raise HTTPException(status_code=403, detail="Insufficient permissions")
+        return current_user
+    return role_checker
+
+async def commit_or_conflict(db: AsyncSession):
+    try:
+        await db.commit()
+    except StaleDataError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Modified by another request, reload and retry")
+
+# Auth endpoints
+@router.post("/api/auth/register", response_model=Token, dependencies=[Depends(auth_limit)])
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    service.check_unregistered((await db.scalars(queries.user_by_login(user.email_or_phone))).first())
+    new_user = service.new_user(user, await run_in_threadpool(get_password_hash, user.password))
+    db.add(new_user)
+    await db.commit()
+    await db.refresh(new_user)
+    return service.token_response(new_user)
+
+@router.post("/api/auth/login", response_model=Token, dependencies=[Depends(auth_limit)])
+async def login(user: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    db_user = (await db.scalars(queries.user_by_login(user.email_or_phone))).first()
+    service.check_login(db_user, db_user is not None and await run_in_threadpool(
+        verify_password, user.password, db_user.hashed_password
+    ))
+    return service.token_response(db_user)
+
+@router.get("/api/auth/me", response_model=UserResponse)
+async def get_me(current_user: User = Depends(get_current_user_async)):
+    return current_user
+
+# Listing endpoints
+@router.post("/api/listings", response_model=ListingResponse)
+async def create_listing(
+    listing: ListingCreate,
+    current_user: User = Depends(require_role_async([UserRole.SELLER, UserRole.ADMIN])),
+    db: AsyncSession = Depends(get_async_db)
+):
+    new_listing = Listing(**listing.dict(), seller_id=current_user.id)
+    db.add(new_listing)
+    await db.commit()
+    await db.refresh(new_listing)
+    return new_listing
+
+@router.get("/api/listings", response_model=List[ListingResponse])
+async def get_listings(
+    category: Optional[str] = None,
+    brand: Optional[str] = None,
+    model: Optional[str] = None,
+    condition: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    location: Optional[str] = None,
+    status: ListingStatus = ListingStatus.ACTIVE,
+    skip: int = 0,
+    limit: int = 100,
+    match: queries.MatchMode = "contains",
+    db: AsyncSession = Depends(get_async_db)
+):
+    rows = (await db.execute(queries.columns(queries.listings(
+        status, category, brand, model, condition, min_price, max_price, location, skip, limit, match
+    )))).all()
+    return Response(dump_listings(rows), media_type="application/json")
+
+@router.get("/api/listings/{listing_id}", response_model=ListingResponse)
+async def get_listing(listing_id: int, db: AsyncSession = Depends(get_async_db)):
+    listing = (await db.scalars(queries.listing_by_id(listing_id))).first()
+    service.check_found(listing, "Listing")
+    return listing
+
+@router.put("/api/listings/{listing_id}", response_model=ListingResponse)
+async def update_listing(
+    listing_id: int,
+    listing_update: ListingUpdate,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    changes, version = service.split_update(listing_update)
+    if version is not None:
+        # Fast path: one UPDATE ... WHERE id AND version, no load
+        updated = service.versioned_response((await db.scalars(
+            queries.versioned_update(Listing, listing_id, version, current_user, changes)
+        )).first(), ListingResponse)
+        await db.commit()
+        if updated:
+            return updated
+
+    listing = (await db.scalars(queries.listing_by_id(listing_id))).first()
+    service.resolve_versioned(listing, current_user, version, changes, "Listing")
+    await commit_or_conflict(db)
+    await db.refresh(listing)
+    return listing
+
+@router.delete("/api/listings/{listing_id}")
+async def delete_listing(
+    listing_id: int,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    listing = (await db.scalars(queries.listing_by_id(listing_id))).first()
+    service.check_owner(listing, current_user, "Listing")
+    await db.delete(listing)
+    await commit_or_conflict(db)
+    return {"message": "Listing deleted"}
+
+@router.get("/api/my-listings", response_model=List[ListingResponse])
+async def get_my_listings(
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    rows = (await db.execute(queries.columns(queries.listings_by_seller(current_user.id)))).all()
+    return Response(dump_listings(rows), media_type="application/json")
+
+# Buy Request endpoints
+@router.post("/api/buy-requests", response_model=BuyRequestResponse)
+async def create_buy_request(
+    request: BuyRequestCreate,
+    current_user: User = Depends(require_role_async([UserRole.BUYER, UserRole.ADMIN])),
+    db: AsyncSession = Depends(get_async_db)
+):
+    listing = (await db.scalars(queries.listing_by_id(request.listing_id))).first()
+    new_request = service.new_buy_request(request, listing, current_user)
+    db.add(new_request)
+    await db.commit()
+    await db.refresh(new_request)
+    return new_request
+
+@router.get("/api/buy-requests", response_model=List[BuyRequestDetail])
+async def get_buy_requests(
+    response: Response,
+    status: Optional[BuyRequestStatus] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    cursor: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    rows = (await db.scalars(queries.buy_requests_for(
+        current_user, status, created_after, created_before, cursor, limit
+    ))).all()
+    rows, next_cursor = queries.page(rows, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
+    return rows
+
+@router.put("/api/buy-requests/{request_id}", response_model=BuyRequestResponse)
+async def update_buy_request(
+    request_id: int,
+    request_update: BuyRequestUpdate,
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    changes, version = service.split_update(request_update)
+    commission_status = changes.pop("commission_status", None)
+    updated = None
+    if version is not None:
+        updated = service.versioned_response((await db.scalars(
+            queries.versioned_update(BuyRequest, request_id, version, current_user, changes)
+        )).first(), BuyRequestResponse)
+        if updated:
+            service.queue_commission(db, request_id, commission_status)
+        await db.commit()
+
+    if not updated:
+        buy_request = (await db.scalars(queries.buy_request_by_id(request_id))).first()
+        service.resolve_versioned(buy_request, current_user, version, changes, "Buy request")
+        service.queue_commission(db, request_id, commission_status)
+        await commit_or_conflict(db)
+        await db.refresh(buy_request)
+        updated = buy_request
+
+    if commission_status is not None:
+        jobs.queue.nudge()
+    return updated
+
+# Admin endpoints
+@router.get("/api/admin/stats")
+async def get_admin_stats(
+    current_user: User = Depends(require_role_async([UserRole.ADMIN])),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if stats.snapshot is not None:
+        return stats.snapshot
+    return await stats.compute_admin_stats_async(db)
+
+@router.get("/api/admin/jobs")
+async def get_job_dashboard(current_user: User = Depends(require_role_async([UserRole.ADMIN]))):
+    return await run_in_threadpool(jobs.queue.dashboard)
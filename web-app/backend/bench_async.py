@@ -0,0 +1,118 @@
+"""Compare the sync and async (ASYNC_DATABASE) API under concurrent load.
+
+Starts one uvicorn server per mode on a throwaway SQLite database, seeds it,
+then hammers GET /api/listings and GET /api/buy-requests with a fixed number
+of in-flight requests and prints throughput and latency percentiles.
+
+    python bench_async.py --requests 2000 --concurrency 64
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def start_server(mode, port, db_path, stderr=None, **env):
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{db_path}",
+        ASYNC_DATABASE="true" if mode == "async" else "false",
+        JOBS_DATABASE=os.path.join(os.path.dirname(db_path), "jobs.db"),
+        RATE_LIMIT_DATABASE=os.path.join(os.path.dirname(db_path), "ratelimit.db"),
+        AUTH_RATE_PER_MINUTE="0",  # seeding registers from a single address
+        **env,
+    )
+    subprocess.run([sys.executable, "migrate.py"], cwd=BACKEND_DIR, env=env, check=True, stdout=subprocess.DEVNULL)
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stderr=stderr,
+    )
+
+async def wait_ready(client):
+    for _ in range(100):
+        try:
+            await client.get("/docs")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+async def seed(client, listings, buy_requests):
+    async def register(name, role):
+        r = await client.post("/api/auth/register", json={
+            "name": name, "email_or_phone": f"{name}@bench", "password": "bench", "role": role,
+        })
+        r.raise_for_status()
+        return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+    seller = await register("seller", "seller")
+    buyer = await register("buyer", "buyer")
+    for i in range(listings):
+        await client.post("/api/listings", headers=seller, json={
+            "category": "Phone", "brand": f"Brand{i % 10}", "model": f"Model{i}",
+            "condition": "broken", "price": 10 + i, "location": "Delhi", "photos": [],
+        })
+    for i in range(buy_requests):
+        await client.post("/api/buy-requests", headers=buyer, json={"listing_id": i % listings + 1})
+    return seller
+
+async def load(client, path, headers, total, concurrency):
+    latencies = []
+    remaining = iter(range(total))
+
+    async def worker():
+        for _ in remaining:
+            start = time.perf_counter()
+            r = await client.get(path, headers=headers)
+            r.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "rps": total / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p99": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+async def bench_mode(mode, port, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        server = start_server(mode, port, os.path.join(tmp, "bench.db"))
+        limits = httpx.Limits(max_connections=args.concurrency)
+        try:
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+                await wait_ready(client)
+                seller = await seed(client, args.listings, args.buy_requests)
+                return {
+                    path: await load(client, path, headers, args.requests, args.concurrency)
+                    for path, headers in (("/api/listings", {}), ("/api/buy-requests", seller))
+                }
+        finally:
+            server.terminate()
+            server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--listings", type=int, default=100)
+    parser.add_argument("--buy-requests", type=int, default=100)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    for i, mode in enumerate(("sync", "async")):
+        results = asyncio.run(bench_mode(mode, args.port + i, args))
+        for path, r in results.items():
+            print(f"{mode:5} {path:20} {r['rps']:8.1f} req/s  p50 {r['p50']:7.1f} ms  p99 {r['p99']:7.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Compare the two ways of turning a listings page into a JSON body.
+
+    orm  - select(Listing) -> ORM objects -> response_model validation
+           (from_attributes) -> jsonable_encoder -> json.dumps, i.e. what
+           FastAPI does when a handler returns ORM objects
+    rows - column-only select -> Row tuples -> schemas.dump_listings
+
+Runs in-process against a throwaway SQLite database, so only query
+materialization and serialization are measured, not HTTP.
+
+    python bench_serialize.py --listings 1000 --page 100
+"""
+import argparse
+import json
+import os
+import tempfile
+import timeit
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--listings", type=int, default=1000)
+    parser.add_argument("--page", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        bench(args, tmp)
+
+def bench(args, tmp):
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ["ASYNC_DATABASE"] = "false"
+
+    from fastapi.encoders import jsonable_encoder
+    from pydantic import TypeAdapter
+    from typing import List
+    from database import engine, SessionLocal
+    from models import Base, User, Listing, UserRole
+    from schemas import ListingResponse, dump_listings
+    import queries
+
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        seller = User(name="seller", email_or_phone="seller@bench", hashed_password="x", role=UserRole.SELLER)
+        db.add(seller)
+        db.flush()
+        db.add_all(
+            Listing(
+                seller_id=seller.id, category="Phone", brand=f"Brand{i % 10}", model=f"Model{i}",
+                condition="broken", working_parts="screen, battery", price=10 + i, location="Delhi",
+                description="Cracked back glass, boots fine", photos=[f"/photos/{i}-{j}.jpg" for j in range(3)],
+            )
+            for i in range(args.listings)
+        )
+        db.commit()
+
+    response_field = TypeAdapter(List[ListingResponse])
+    query = queries.listings(limit=args.page)
+
+    def orm_path():
+        with SessionLocal() as db:
+            listings = db.scalars(query).all()
+            validated = response_field.validate_python(listings, from_attributes=True)
+            return json.dumps(jsonable_encoder(validated)).encode()
+
+    def rows_path():
+        with SessionLocal() as db:
+            return dump_listings(db.execute(queries.columns(query)).all())
+
+    assert json.loads(orm_path()) == json.loads(rows_path())
+    for name, func in (("orm", orm_path), ("rows", rows_path)):
+        seconds = min(timeit.repeat(func, number=args.repeat, repeat=3)) / args.repeat
+        print(f"{name:5} {args.page:4} listings/page  {seconds * 1000:7.3f} ms/page")
+    engine.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,27 @@ class Settings(BaseSettings):
     SECRET_KEY: str = "your-secret-key-change-in-production-min-32-characters-long"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # Serve the API from async handlers on an async engine (aiosqlite/asyncpg)
+    ASYNC_DATABASE: bool = False
+    # SQLite tuning, applied to every new connection (see database.py)
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_POOL_SIZE: int = 40
+    # Funnel all write transactions through one writer at a time (sync engine)
+    SQLITE_SINGLE_WRITER: bool = False
+    # Serve /api/admin/stats from a snapshot refreshed every N seconds (0 = live)
+    ADMIN_STATS_REFRESH_SECONDS: int = 0
+    # Background jobs (see jobs.py); kept in their own SQLite file
+    JOBS_DATABASE: str = "./jobs.db"
+    JOB_WORKERS: int = 2
+    JOB_MAX_ATTEMPTS: int = 5
+    # Per-client token buckets shared by all workers (see ratelimit.py);
+    # a rate of 0 disables that limit
+    RATE_LIMIT_DATABASE: str = "./ratelimit.db"
+    AUTH_RATE_PER_MINUTE: int = 10
+    AUTH_BURST: int = 5
+    API_RATE_PER_MINUTE: int = 0
+    API_BURST: int = 60
     
     class Config:
         env_file = ".env"
@@ -1,17 +1,86 @@
-from sqlalchemy import create_engine
+import threading
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from config import settings
 
 # SQLite needs check_same_thread=False
 connect_args = {"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
-engine = create_engine(settings.DATABASE_URL, connect_args=connect_args)
+# SQLite connections are cheap file handles: size the pool to the threadpool
+# (40 workers) so requests never queue for a connection while holding one
+# across bcrypt work
+pool_args = {"pool_size": settings.SQLITE_POOL_SIZE} if settings.DATABASE_URL.startswith("sqlite:///") else {}
+engine = create_engine(settings.DATABASE_URL, connect_args=connect_args, **pool_args)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# SQLite profile: WAL lets readers run alongside the writer, busy_timeout makes
+# a writer wait for the lock instead of failing with "database is locked", and
+# synchronous=NORMAL is durable enough under WAL while skipping most fsyncs.
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}")
+    cursor.close()
+
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", apply_sqlite_pragmas)
+
+# Single-writer mode: a session takes the writer lock on its first write
+# (flush or bulk UPDATE/DELETE) and holds it until its transaction ends, so
+# write transactions queue up in-process instead of contending in SQLite.
+writer_lock = threading.Lock()
+
+def acquire_writer(session):
+    if not session.info.get("writer"):
+        writer_lock.acquire()
+        session.info["writer"] = True
+
+def release_writer(session, transaction):
+    if transaction.parent is None and session.info.pop("writer", False):
+        writer_lock.release()
+
+if settings.SQLITE_SINGLE_WRITER:
+    @event.listens_for(SessionLocal, "before_flush")
+    def writer_before_flush(session, flush_context, instances):
+        acquire_writer(session)
+
+    @event.listens_for(SessionLocal, "do_orm_execute")
+    def writer_on_execute(orm_execute_state):
+        if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+            acquire_writer(orm_execute_state.session)
+
+    event.listen(SessionLocal, "after_transaction_end", release_writer)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+# Async engine, only built when ASYNC_DATABASE is on so the async drivers
+# stay optional for the sync deployment
+def async_database_url(url: str) -> str:
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    return url
+
+async_engine = None
+AsyncSessionLocal = None
+if settings.ASYNC_DATABASE:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    async_engine = create_async_engine(async_database_url(settings.DATABASE_URL))
+    if async_engine.dialect.name == "sqlite":
+        event.listen(async_engine.sync_engine, "connect", apply_sqlite_pragmas)
+    # expire_on_commit=False: responses read attributes after commit without lazy IO
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
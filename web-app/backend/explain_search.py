@@ -0,0 +1,48 @@
+"""Check that the listing search modes are served by indexes.
+
+Builds a scratch SQLite database from the models, then runs EXPLAIN QUERY PLAN
+on the statements GET /api/listings issues for each match mode and fails if
+one of them falls back to scanning the listings table.
+
+    python explain_search.py
+"""
+import os
+import sys
+import tempfile
+
+from sqlalchemy import create_engine
+
+from models import Base
+import queries
+
+CASES = (
+    # (description, queries.listings kwargs, text the plan must contain)
+    ("exact brand", {"brand": "Apple", "match": "exact"}, "ix_listings_status_brand_lower"),
+    ("prefix brand", {"brand": "App", "match": "prefix"}, "ix_listings_status_brand_lower"),
+    ("prefix category", {"category": "Pho", "match": "prefix"}, "ix_listings_status_category_lower"),
+    ("exact model", {"model": "iPhone X", "match": "exact"}, "ix_listings_status_model_lower"),
+    ("contains brand", {"brand": "ppl"}, "VIRTUAL TABLE INDEX"),
+    ("contains brand+model", {"brand": "ppl", "model": "hone"}, "VIRTUAL TABLE INDEX"),
+)
+
+def plan(conn, statement):
+    sql = statement.compile(conn.engine, compile_kwargs={"literal_binds": True})
+    return [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'explain.db')}")
+        Base.metadata.create_all(bind=engine)
+        failed = 0
+        with engine.connect() as conn:
+            for name, kwargs, expected in CASES:
+                steps = plan(conn, queries.listings(**kwargs))
+                full_scan = any(s.split()[:2] == ["SCAN", "listings"] for s in steps)
+                ok = any(expected in s for s in steps) and not full_scan
+                failed += not ok
+                print(f"{'ok ' if ok else 'FAIL'} {name}: {' | '.join(steps)}")
+        engine.dispose()
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# In-process background jobs. Jobs are rows in their own SQLite file (so they
+# survive restarts whatever DATABASE_URL points at), handlers are looked up by
+# kind, and a small pool of worker threads runs them. A failing job is retried
+# with exponential backoff until it runs out of attempts.
+#
+# Jobs caused by an API write don't go straight into this file: the handler
+# adds them to the app database's job_outbox table in the write's own
+# transaction, and a relay thread moves committed outbox rows into the queue
+# (see drain_outbox). So a job exists exactly when its write does, and a
+# broken queue delays jobs instead of failing requests.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',  -- queued / running / done / failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    run_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_jobs_status_run_at ON jobs(status, run_at);
+"""
+
+class JobQueue:
+    def __init__(self, path, workers=2, max_attempts=5, backoff=2.0, max_backoff=300.0, lease=300.0,
+                 outbox_interval=1.0, error_backoff=1.0):
+        self.path = path
+        self.lease = lease
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.handlers = {}
+        self.threads = []
+        self.lock = threading.Lock()  # serializes use of the shared connection
+        self.wakeup = threading.Condition()
+        self.stopping = False
+        self.conn = None
+        self.outbox = None  # callable moving committed outbox rows into the queue
+        self.outbox_interval = outbox_interval
+        self.error_backoff = error_backoff  # seconds a worker waits after a queue error
+        self.outbox_ready = threading.Event()
+
+    def handler(self, kind):
+        def decorator(func):
+            self.handlers[kind] = func
+            return func
+        return decorator
+
+    def connect(self):
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self.conn.row_factory = sqlite3.Row
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(SCHEMA)
+        return self.conn
+
+    def enqueue(self, kind, payload, delay=0.0):
+        """Persist a job and wake a worker; returns the job id."""
+        now = time.time()
+        with self.lock:
+            job_id = self.connect().execute(
+                "INSERT INTO jobs (kind, payload, run_at, created_at) VALUES (?, ?, ?, ?)",
+                (kind, json.dumps(payload), now + delay, now),
+            ).lastrowid
+        with self.wakeup:
+            self.wakeup.notify()
+        return job_id
+
+    def start(self):
+        self.stopping = False
+        for i in range(self.workers):
+            thread = threading.Thread(target=self.work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        if self.outbox is not None:
+            thread = threading.Thread(target=self.relay, name="job-outbox", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        self.stopping = True
+        self.outbox_ready.set()
+        with self.wakeup:
+            self.wakeup.notify_all()
+        for thread in self.threads:
+            thread.join(timeout=5)
+        self.threads = []
+
+    def nudge(self):
+        """Have the relay look at the outbox now; call after committing to it."""
+        self.outbox_ready.set()
+
+    def relay(self):
+        # Other processes' writes are only seen by polling, every
+        # outbox_interval seconds; this process's writes nudge the relay
+        while not self.stopping:
+            self.outbox_ready.clear()
+            try:
+                moved = self.outbox(self)
+            except Exception:
+                logger.exception("Moving jobs out of the outbox failed")
+                moved = 0
+            if not moved:
+                self.outbox_ready.wait(self.outbox_interval)
+
+    def claim(self):
+        # Several worker processes may share the file (see serve.py), so a
+        # job is claimed with a single UPDATE. A job still running after
+        # `lease` seconds is taken to belong to a crashed process and claimed
+        # again.
+        now = time.time()
+        with self.lock:
+            return self.connect().execute(
+                """UPDATE jobs SET status='running', started_at=?, attempts=attempts + 1
+                   WHERE id = (SELECT id FROM jobs
+                               WHERE (status='queued' AND run_at <= ?)
+                                  OR (status='running' AND started_at < ?)
+                               ORDER BY run_at LIMIT 1)
+                   RETURNING *""",
+                (now, now, now - self.lease),
+            ).fetchone()
+
+    def next_run_at(self):
+        with self.lock:
+            row = self.connect().execute("SELECT min(run_at) FROM jobs WHERE status='queued'").fetchone()
+        return row[0]
+
+    def work(self):
+        while not self.stopping:
+            try:
+                job = self.claim()
+                if job is None:
+                    run_at = self.next_run_at()
+                    timeout = 5.0 if run_at is None else min(max(run_at - time.time(), 0.01), 5.0)
+                    with self.wakeup:
+                        self.wakeup.wait(timeout)
+                    continue
+                self.run(job)
+            except Exception:
+                # e.g. "database is locked" with several processes on the
+                # file; a job left 'running' is reclaimed once its lease ends
+                logger.exception("Job worker error, retrying")
+                with self.wakeup:
+                    self.wakeup.wait(self.error_backoff)
+
+    def run(self, job):
+        try:
+            handler = self.handlers[job["kind"]]
+            handler(**json.loads(job["payload"]))
+        except Exception as e:
+            logger.exception("Job %s (%s) failed, attempt %d", job["id"], job["kind"], job["attempts"])
+            if job["attempts"] >= self.max_attempts:
+                status, run_at = "failed", job["run_at"]
+            else:
+                delay = min(self.backoff * 2 ** (job["attempts"] - 1), self.max_backoff)
+                status, run_at = "queued", time.time() + delay
+            with self.lock:
+                self.connect().execute(
+                    "UPDATE jobs SET status=?, run_at=?, finished_at=?, last_error=? WHERE id=?",
+                    (status, run_at, time.time(), repr(e), job["id"]),
+                )
+            return
+        with self.lock:
+            self.connect().execute(
+                "UPDATE jobs SET status='done', finished_at=? WHERE id=?", (time.time(), job["id"])
+            )
+
+    def dashboard(self, window=500):
+        """Queue depth per status and latency over the last `window` finished jobs."""
+        with self.lock:
+            conn = self.connect()
+            depth = dict(conn.execute("SELECT status, count(*) FROM jobs GROUP BY status").fetchall())
+            rows = conn.execute(
+                """SELECT finished_at - created_at, finished_at - started_at FROM jobs
+                   WHERE status='done' ORDER BY finished_at DESC LIMIT ?""",
+                (window,),
+            ).fetchall()
+            oldest = conn.execute("SELECT min(created_at) FROM jobs WHERE status='queued'").fetchone()[0]
+            failures = [dict(r) for r in conn.execute(
+                """SELECT id, kind, attempts, last_error, finished_at FROM jobs
+                   WHERE status='failed' ORDER BY finished_at DESC LIMIT 10"""
+            )]
+
+        def percentiles(values):
+            if not values:
+                return None
+            values = sorted(values)
+            pick = lambda q: round(values[min(int(len(values) * q), len(values) - 1)] * 1000, 1)
+            return {"p50_ms": pick(0.5), "p95_ms": pick(0.95), "max_ms": round(values[-1] * 1000, 1)}
+
+        return {
+            "depth": {s: depth.get(s, 0) for s in ("queued", "running", "done", "failed")},
+            "oldest_queued_age_s": round(time.time() - oldest, 1) if oldest else None,
+            "latency": percentiles([r[0] for r in rows]),  # enqueue -> done
+            "run_time": percentiles([r[1] for r in rows]),  # last attempt only
+            "recent_failures": failures,
+        }
+
+def drain_outbox(queue, batch=100):
+    """Move up to `batch` committed outbox rows into `queue`; returns how many.
+
+    The rows are deleted and enqueued in one app-DB transaction that commits
+    after the enqueue, so a crash in between leaves them to be moved again:
+    delivery is at-least-once, and handlers must be idempotent."""
+    from sqlalchemy import delete, select
+    from database import SessionLocal
+    from models import OutboxJob
+    with SessionLocal() as db:
+        taken = select(OutboxJob.id).order_by(OutboxJob.id).limit(batch)
+        rows = db.execute(
+            delete(OutboxJob).where(OutboxJob.id.in_(taken))
+            .returning(OutboxJob.id, OutboxJob.kind, OutboxJob.payload)
+        ).all()
+        for row in sorted(rows):
+            queue.enqueue(row.kind, row.payload)
+        db.commit()
+    return len(rows)
+
+queue = JobQueue(settings.JOBS_DATABASE, workers=settings.JOB_WORKERS, max_attempts=settings.JOB_MAX_ATTEMPTS)
+queue.outbox = drain_outbox
+
+# Job handlers
+
+@queue.handler("commission.record")
+def record_commission(request_id: int, commission_status: str):
+    # Imported here so this module stays importable without the ORM setup
+    from sqlalchemy import update
+    from database import SessionLocal
+    from models import BuyRequest
+    # A plain UPDATE rather than an ORM flush, so this bookkeeping doesn't
+    # bump the version the client just got back from update_buy_request.
+    # Setting a value is idempotent, as outbox delivery requires.
+    with SessionLocal() as db:
+        db.execute(
+            update(BuyRequest).where(BuyRequest.id == request_id).values(commission_status=commission_status)
+        )
+        db.commit()
@@ -1,25 +1,44 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Query
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Response, status, Query
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
 from typing import List, Optional
-from datetime import timedelta
+from datetime import datetime
+from contextlib import asynccontextmanager
+import asyncio
 
-from database import engine, get_db
-from models import Base, User, Listing, BuyRequest, UserRole, ListingStatus, BuyRequestStatus
+from database import get_db
+from models import User, Listing, BuyRequest, UserRole, ListingStatus, BuyRequestStatus
 from schemas import (
     UserCreate, UserLogin, UserResponse, Token,
     ListingCreate, ListingUpdate, ListingResponse,
-    BuyRequestCreate, BuyRequestUpdate, BuyRequestResponse
-)
-from auth import (
-    get_password_hash, verify_password, create_access_token,
-    get_current_user, require_role
+    BuyRequestCreate, BuyRequestUpdate, BuyRequestResponse, BuyRequestDetail,
+    dump_listings
 )
+from auth import get_password_hash, verify_password, get_current_user, require_role
 from config import settings
-
-Base.metadata.create_all(bind=engine)
-
-app = FastAPI(title="Electronic Parts Marketplace API")
+from ratelimit import auth_limit, api_limit
+import queries
+import service
+import stats
+import jobs
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    jobs.queue.start()
+    tasks = []
+    if settings.ADMIN_STATS_REFRESH_SECONDS > 0:
+        tasks.append(asyncio.create_task(stats.refresh_loop(settings.ADMIN_STATS_REFRESH_SECONDS)))
+    yield
+    for task in tasks:
+        task.cancel()
+    jobs.queue.stop()
+
+app = FastAPI(
+    title="Electronic Parts Marketplace API",
+    lifespan=lifespan,
+    dependencies=[Depends(api_limit)],
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -27,51 +46,42 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+def commit_or_conflict(db: Session):
+    try:
+        db.commit()
+    except StaleDataError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Modified by another request, reload and retry")
+
+# Sync handlers (threadpool + sync engine). The async equivalents live in
+# async_api.py and are mounted instead when settings.ASYNC_DATABASE is on.
+api = APIRouter()
+
 # Auth endpoints
-@app.post("/api/auth/register", response_model=Token)
+@api.post("/api/auth/register", response_model=Token, dependencies=[Depends(auth_limit)])
 def register(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email_or_phone == user.email_or_phone).first()
-    if db_user:
-        raise HTTPException(status_code=400, detail="Email or phone already registered")
-    
-    hashed_password = get_password_hash(user.password)
-    new_user = User(
-        name=user.name,
-        email_or_phone=user.email_or_phone,
-        hashed_password=hashed_password,
-        role=user.role,
-        location=user.location
-    )
+    service.check_unregistered(db.scalars(queries.user_by_login(user.email_or_phone)).first())
+    new_user = service.new_user(user, get_password_hash(user.password))
     db.add(new_user)
     db.commit()
     db.refresh(new_user)
-    
-    access_token = create_access_token(
-        data={"sub": str(new_user.id)},
-        expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    )
-    return {"access_token": access_token, "token_type": "bearer", "user": new_user}
-
-@app.post("/api/auth/login", response_model=Token)
+    return service.token_response(new_user)
+
+@api.post("/api/auth/login", response_model=Token, dependencies=[Depends(auth_limit)])
 def login(user: UserLogin, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email_or_phone == user.email_or_phone).first()
-    if not db_user or not verify_password(user.password, db_user.hashed_password):
-        raise HTTPException(status_code=401, detail="Incorrect credentials")
-    
-    access_token = create_access_token(
-        data={"sub": str(db_user.id)},
-        expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    )
-    return {"access_token": access_token, "token_type": "bearer", "user": db_user}
-
-@app.get("/api/auth/me", response_model=UserResponse)
+    db_user = db.scalars(queries.user_by_login(user.email_or_phone)).first()
+    service.check_login(db_user, db_user is not None and verify_password(user.password, db_user.hashed_password))
+    return service.token_response(db_user)
+
+@api.get("/api/auth/me", response_model=UserResponse)
 def get_me(current_user: User = Depends(get_current_user)):
     return current_user
 
 # Listing endpoints
-@app.post("/api/listings", response_model=ListingResponse)
+@api.post("/api/listings", response_model=ListingResponse)
 def create_listing(
     listing: ListingCreate,
     current_user: User = Depends(require_role([UserRole.SELLER, UserRole.ADMIN])),
@@ -83,7 +93,7 @@ def create_listing(
     db.refresh(new_listing)
     return new_listing
 
-@app.get("/api/listings", response_model=List[ListingResponse])
+@api.get("/api/listings", response_model=List[ListingResponse])
 def get_listings(
     category: Optional[str] = None,
     brand: Optional[str] = None,
@@ -95,156 +105,148 @@ def get_listings(
     status: ListingStatus = ListingStatus.ACTIVE,
     skip: int = 0,
     limit: int = 100,
+    match: queries.MatchMode = "contains",
     db: Session = Depends(get_db)
 ):
-    query = db.query(Listing).filter(Listing.status == status)
-    
-    if category:
-        query = query.filter(Listing.category.ilike(f"%{category}%"))
-    if brand:
-        query = query.filter(Listing.brand.ilike(f"%{brand}%"))
-    if model:
-        query = query.filter(Listing.model.ilike(f"%{model}%"))
-    if condition:
-        query = query.filter(Listing.condition.ilike(f"%{condition}%"))
-    if min_price:
-        query = query.filter(Listing.price >= min_price)
-    if max_price:
-        query = query.filter(Listing.price <= max_price)
-    if location:
-        query = query.filter(Listing.location.ilike(f"%{location}%"))
-    
-    return query.offset(skip).limit(limit).all()
-
-@app.get("/api/listings/{listing_id}", response_model=ListingResponse)
+    rows = db.execute(queries.columns(queries.listings(
+        status, category, brand, model, condition, min_price, max_price, location, skip, limit, match
+    ))).all()
+    return Response(dump_listings(rows), media_type="application/json")
+
+@api.get("/api/listings/{listing_id}", response_model=ListingResponse)
 def get_listing(listing_id: int, db: Session = Depends(get_db)):
-    listing = db.query(Listing).filter(Listing.id == listing_id).first()
-    if not listing:
-        raise HTTPException(status_code=404, detail="Listing not found")
+    listing = db.scalars(queries.listing_by_id(listing_id)).first()
+    service.check_found(listing, "Listing")
     return listing
 
-@app.put("/api/listings/{listing_id}", response_model=ListingResponse)
+@api.put("/api/listings/{listing_id}", response_model=ListingResponse)
 def update_listing(
     listing_id: int,
     listing_update: ListingUpdate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    listing = db.query(Listing).filter(Listing.id == listing_id).first()
-    if not listing:
-        raise HTTPException(status_code=404, detail="Listing not found")
-    
-    if listing.seller_id != current_user.id and current_user.role != UserRole.ADMIN:
-        raise HTTPException(status_code=403, detail="Not authorized")
-    
-    for key, value in listing_update.dict(exclude_unset=True).items():
-        setattr(listing, key, value)
-    
-    db.commit()
+    changes, version = service.split_update(listing_update)
+    if version is not None:
+        # Fast path: one UPDATE ... WHERE id AND version, no load
+        updated = service.versioned_response(db.scalars(
+            queries.versioned_update(Listing, listing_id, version, current_user, changes)
+        ).first(), ListingResponse)
+        db.commit()
+        if updated:
+            return updated
+
+    listing = db.scalars(queries.listing_by_id(listing_id)).first()
+    service.resolve_versioned(listing, current_user, version, changes, "Listing")
+    commit_or_conflict(db)
     db.refresh(listing)
     return listing
 
-@app.delete("/api/listings/{listing_id}")
+@api.delete("/api/listings/{listing_id}")
 def delete_listing(
     listing_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    listing = db.query(Listing).filter(Listing.id == listing_id).first()
-    if not listing:
-        raise HTTPException(status_code=404, detail="Listing not found")
-    
-    if listing.seller_id != current_user.id and current_user.role != UserRole.ADMIN:
-        raise HTTPException(status_code=403, detail="Not authorized")
-    
+    listing = db.scalars(queries.listing_by_id(listing_id)).first()
+    service.check_owner(listing, current_user, "Listing")
     db.delete(listing)
-    db.commit()
+    commit_or_conflict(db)
     return {"message": "Listing deleted"}
 
-@app.get("/api/my-listings", response_model=List[ListingResponse])
+@api.get("/api/my-listings", response_model=List[ListingResponse])
 def get_my_listings(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    return db.query(Listing).filter(Listing.seller_id == current_user.id).all()
+    rows = db.execute(queries.columns(queries.listings_by_seller(current_user.id))).all()
+    return Response(dump_listings(rows), media_type="application/json")
 
 # Buy Request endpoints
-@app.post("/api/buy-requests", response_model=BuyRequestResponse)
+@api.post("/api/buy-requests", response_model=BuyRequestResponse)
 def create_buy_request(
     request: BuyRequestCreate,
     current_user: User = Depends(require_role([UserRole.BUYER, UserRole.ADMIN])),
     db: Session = Depends(get_db)
 ):
-    listing = db.query(Listing).filter(Listing.id == request.listing_id).first()
-    if not listing:
-        raise HTTPException(status_code=404, detail="Listing not found")
-    
-    if listing.status != ListingStatus.ACTIVE:
-        raise HTTPException(status_code=400, detail="Listing is not active")
-    
-    new_request = BuyRequest(
-        listing_id=request.listing_id,
-        buyer_id=current_user.id,
-        seller_id=listing.seller_id
-    )
+    listing = db.scalars(queries.listing_by_id(request.listing_id)).first()
+    new_request = service.new_buy_request(request, listing, current_user)
     db.add(new_request)
     db.commit()
     db.refresh(new_request)
     return new_request
 
-@app.get("/api/buy-requests", response_model=List[BuyRequestResponse])
+@api.get("/api/buy-requests", response_model=List[BuyRequestDetail])
 def get_buy_requests(
+    response: Response,
+    status: Optional[BuyRequestStatus] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    cursor: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    if current_user.role == UserRole.ADMIN:
-        return db.query(BuyRequest).all()
-    elif current_user.role == UserRole.SELLER:
-        return db.query(BuyRequest).filter(BuyRequest.seller_id == current_user.id).all()
-    else:
-        return db.query(BuyRequest).filter(BuyRequest.buyer_id == current_user.id).all()
-
-@app.put("/api/buy-requests/{request_id}", response_model=BuyRequestResponse)
+    # Admins see everything, sellers their incoming requests, buyers their own;
+    # pass the X-Next-Cursor header back as ?cursor= for the next page
+    rows = db.scalars(queries.buy_requests_for(
+        current_user, status, created_after, created_before, cursor, limit
+    )).all()
+    rows, next_cursor = queries.page(rows, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
+    return rows
+
+@api.put("/api/buy-requests/{request_id}", response_model=BuyRequestResponse)
 def update_buy_request(
     request_id: int,
     request_update: BuyRequestUpdate,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    buy_request = db.query(BuyRequest).filter(BuyRequest.id == request_id).first()
-    if not buy_request:
-        raise HTTPException(status_code=404, detail="Buy request not found")
-    
-    if buy_request.seller_id != current_user.id and current_user.role != UserRole.ADMIN:
-        raise HTTPException(status_code=403, detail="Not authorized")
-    
-    for key, value in request_update.dict(exclude_unset=True).items():
-        setattr(buy_request, key, value)
-    
-    db.commit()
-    db.refresh(buy_request)
-    return buy_request
+    changes, version = service.split_update(request_update)
+    commission_status = changes.pop("commission_status", None)
+    updated = None
+    if version is not None:
+        updated = service.versioned_response(db.scalars(
+            queries.versioned_update(BuyRequest, request_id, version, current_user, changes)
+        ).first(), BuyRequestResponse)
+        if updated:
+            service.queue_commission(db, request_id, commission_status)
+        db.commit()
+
+    if not updated:
+        buy_request = db.scalars(queries.buy_request_by_id(request_id)).first()
+        service.resolve_versioned(buy_request, current_user, version, changes, "Buy request")
+        service.queue_commission(db, request_id, commission_status)
+        commit_or_conflict(db)
+        db.refresh(buy_request)
+        updated = buy_request
+
+    # Commission bookkeeping runs in the background
+    if commission_status is not None:
+        jobs.queue.nudge()
+    return updated
 
 # Admin endpoints
-@app.get("/api/admin/stats")
+@api.get("/api/admin/stats")
 def get_admin_stats(
     current_user: User = Depends(require_role([UserRole.ADMIN])),
     db: Session = Depends(get_db)
 ):
-    total_listings = db.query(Listing).count()
-    active_listings = db.query(Listing).filter(Listing.status == ListingStatus.ACTIVE).count()
-    total_requests = db.query(BuyRequest).count()
-    pending_commissions = db.query(BuyRequest).filter(
-        BuyRequest.status == BuyRequestStatus.COMPLETED,
-        BuyRequest.commission_status == "pending"
-    ).count()
-    
-    return {
-        "total_listings": total_listings,
-        "active_listings": active_listings,
-        "total_requests": total_requests,
-        "pending_commissions": pending_commissions
-    }
+    if stats.snapshot is not None:
+        return stats.snapshot
+    return stats.compute_admin_stats(db)
+
+@api.get("/api/admin/jobs")
+def get_job_dashboard(current_user: User = Depends(require_role([UserRole.ADMIN]))):
+    return jobs.queue.dashboard()
+
+if settings.ASYNC_DATABASE:
+    import async_api
+    app.include_router(async_api.router)
+else:
+    app.include_router(api)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,62 @@
+"""Bring the database schema up to date.
+
+Run once per deploy, before starting the API (serve.py does it before forking
+workers). The API itself no longer touches the schema at import.
+
+    python migrate.py
+"""
+import logging
+
+from sqlalchemy import MetaData, Table, Column, Integer, inspect, select, text, insert, update
+from sqlalchemy.schema import CreateIndex
+
+from database import engine
+from models import Base, OutboxJob
+
+logger = logging.getLogger(__name__)
+
+# Migrations run in order, each exactly once; the number applied so far is
+# kept in schema_version. Append new steps, never edit or reorder old ones.
+migrations_metadata = MetaData()
+schema_version = Table("schema_version", migrations_metadata, Column("version", Integer, nullable=False))
+
+def m001_base_schema(conn):
+    # Also the entry point for databases the API created at import before
+    # this command existed: create_all only adds missing tables, so indexes
+    # added to the models since (see models.py) are created explicitly.
+    Base.metadata.create_all(conn)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            # IF NOT EXISTS rather than checkfirst, which can't see
+            # expression indexes on SQLite
+            conn.execute(CreateIndex(index, if_not_exists=True))
+
+def m002_version_columns(conn):
+    # Optimistic-locking columns on tables created before they existed
+    inspector = inspect(conn)
+    for table in ("listings", "buy_requests"):
+        if "version" not in {c["name"] for c in inspector.get_columns(table)}:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
+
+def m003_job_outbox(conn):
+    OutboxJob.__table__.create(conn, checkfirst=True)
+
+MIGRATIONS = [m001_base_schema, m002_version_columns, m003_job_outbox]
+
+def migrate(bind=engine):
+    """Apply pending migrations; returns the resulting schema version."""
+    with bind.begin() as conn:
+        migrations_metadata.create_all(conn)
+        current = conn.scalar(select(schema_version.c.version))
+        if current is None:
+            conn.execute(insert(schema_version).values(version=0))
+            current = 0
+        for version, step in enumerate(MIGRATIONS[current:], current + 1):
+            logger.info("Applying migration %d: %s", version, step.__name__)
+            step(conn)
+        conn.execute(update(schema_version).values(version=len(MIGRATIONS)))
+    return len(MIGRATIONS)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    print(f"Schema at version {migrate()}")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Text, Enum, JSON
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Text, Enum, JSON, Index, event, func
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -51,21 +51,92 @@ class Listing(Base):
     status = Column(Enum(ListingStatus), default=ListingStatus.ACTIVE, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Optimistic locking: every ORM UPDATE/DELETE checks and bumps it
+    version = Column(Integer, nullable=False)
     
     seller = relationship("User", back_populates="listings", foreign_keys=[seller_id])
     buy_requests = relationship("BuyRequest", back_populates="listing")
 
+    __mapper_args__ = {"version_id_col": version}
+
+    # Case-insensitive exact/prefix filters compare lower(column), which the
+    # plain column indexes above can't serve; these can (status first, since
+    # every listing query pins it)
+    __table_args__ = (
+        Index("ix_listings_status_category_lower", status, func.lower(category)),
+        Index("ix_listings_status_brand_lower", status, func.lower(brand)),
+        Index("ix_listings_status_model_lower", status, func.lower(model)),
+    )
+
 class BuyRequest(Base):
     __tablename__ = "buy_requests"
     
     id = Column(Integer, primary_key=True, index=True)
     listing_id = Column(Integer, ForeignKey("listings.id"), nullable=False)
-    buyer_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    seller_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    buyer_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    seller_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     status = Column(Enum(BuyRequestStatus), default=BuyRequestStatus.PENDING)
     commission_status = Column(String, default="pending")
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version = Column(Integer, nullable=False)
     
     listing = relationship("Listing", back_populates="buy_requests")
     buyer = relationship("User", back_populates="buy_requests", foreign_keys=[buyer_id])
+
+    __mapper_args__ = {"version_id_col": version}
+
+class OutboxJob(Base):
+    # Background jobs written in the same transaction as the change that
+    # causes them; jobs.py moves them into the job queue after commit
+    __tablename__ = "job_outbox"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+# Substring search. On SQLite an external-content FTS5 table with the trigram
+# tokenizer indexes category/brand/model and is kept in sync by triggers; on
+# Postgres, pg_trgm GIN indexes make the plain ILIKE '%x%' filters indexable.
+# Created after create_all (IF NOT EXISTS, so existing databases pick it up).
+SEARCH_COLUMNS = ("category", "brand", "model")
+
+SQLITE_SEARCH_DDL = (
+    f"""CREATE VIRTUAL TABLE listings_fts USING fts5(
+        {", ".join(SEARCH_COLUMNS)}, content='listings', content_rowid='id', tokenize='trigram')""",
+    f"""CREATE TRIGGER listings_fts_ai AFTER INSERT ON listings BEGIN
+        INSERT INTO listings_fts(rowid, {", ".join(SEARCH_COLUMNS)})
+        VALUES (new.id, {", ".join("new." + c for c in SEARCH_COLUMNS)});
+    END""",
+    f"""CREATE TRIGGER listings_fts_ad AFTER DELETE ON listings BEGIN
+        INSERT INTO listings_fts(listings_fts, rowid, {", ".join(SEARCH_COLUMNS)})
+        VALUES ('delete', old.id, {", ".join("old." + c for c in SEARCH_COLUMNS)});
+    END""",
+    f"""CREATE TRIGGER listings_fts_au AFTER UPDATE OF {", ".join(SEARCH_COLUMNS)} ON listings BEGIN
+        INSERT INTO listings_fts(listings_fts, rowid, {", ".join(SEARCH_COLUMNS)})
+        VALUES ('delete', old.id, {", ".join("old." + c for c in SEARCH_COLUMNS)});
+        INSERT INTO listings_fts(rowid, {", ".join(SEARCH_COLUMNS)})
+        VALUES (new.id, {", ".join("new." + c for c in SEARCH_COLUMNS)});
+    END""",
+    # Index whatever rows the table already had
+    "INSERT INTO listings_fts(listings_fts) VALUES ('rebuild')",
+)
+
+POSTGRES_SEARCH_DDL = ("CREATE EXTENSION IF NOT EXISTS pg_trgm",) + tuple(
+    f"CREATE INDEX IF NOT EXISTS ix_listings_{c}_trgm ON listings USING gin ({c} gin_trgm_ops)"
+    for c in SEARCH_COLUMNS
+)
+
+@event.listens_for(Base.metadata, "after_create")
+def create_search_index(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        exists = connection.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE name = 'listings_fts'"
+        ).first()
+        if not exists:
+            for statement in SQLITE_SEARCH_DDL:
+                connection.exec_driver_sql(statement)
+    elif connection.dialect.name == "postgresql":
+        for statement in POSTGRES_SEARCH_DDL:
+            connection.exec_driver_sql(statement)
@@ -0,0 +1,154 @@
+from sqlalchemy import select, update, func, and_, table, column, literal_column
+from sqlalchemy.orm import selectinload
+from typing import Optional, Literal
+from datetime import datetime
+
+from config import settings
+from models import User, Listing, BuyRequest, UserRole, ListingStatus, BuyRequestStatus
+
+# Statement builders shared by the sync handlers (main.py) and the async ones
+# (async_api.py), so both paths always run the same SQL.
+
+def user_by_login(email_or_phone: str):
+    return select(User).where(User.email_or_phone == email_or_phone)
+
+def user_by_id(user_id):
+    return select(User).where(User.id == user_id)
+
+def listing_by_id(listing_id: int):
+    return select(Listing).where(Listing.id == listing_id)
+
+# Listing text filters (category/brand/model):
+#   exact / prefix -> lower(column) compared against the (status, lower(column))
+#                     expression indexes; prefix is a range, not LIKE, so the
+#                     index is usable on both SQLite and Postgres
+#   contains       -> FTS5 trigram table on SQLite; ILIKE on Postgres, where
+#                     the pg_trgm GIN indexes serve it (see models.py)
+MatchMode = Literal["contains", "prefix", "exact"]
+USE_FTS = settings.DATABASE_URL.startswith("sqlite")
+FTS_MIN_TERM = 3  # the trigram tokenizer can't match anything shorter
+listings_fts = table("listings_fts", column("rowid"))
+
+def text_filter(col, value: str, match: MatchMode):
+    lowered = value.lower()
+    if match == "exact":
+        return func.lower(col) == lowered
+    if match == "prefix":
+        upper = lowered[:-1] + chr(ord(lowered[-1]) + 1)
+        return and_(func.lower(col) >= lowered, func.lower(col) < upper)
+    return col.ilike(f"%{value}%")
+
+def listings(
+    status: ListingStatus = ListingStatus.ACTIVE,
+    category: Optional[str] = None,
+    brand: Optional[str] = None,
+    model: Optional[str] = None,
+    condition: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    location: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100,
+    match: MatchMode = "contains",
+):
+    query = select(Listing).where(Listing.status == status)
+
+    fts_terms = []
+    for col, value in ((Listing.category, category), (Listing.brand, brand), (Listing.model, model)):
+        if not value:
+            continue
+        if match == "contains" and USE_FTS and len(value) >= FTS_MIN_TERM:
+            phrase = value.replace('"', '""')
+            fts_terms.append(f'{col.key} : "{phrase}"')
+        else:
+            query = query.where(text_filter(col, value, match))
+    if fts_terms:
+        matched = select(listings_fts.c.rowid).where(
+            literal_column("listings_fts").op("MATCH")(" AND ".join(fts_terms))
+        )
+        query = query.where(Listing.id.in_(matched))
+
+    if condition:
+        query = query.where(Listing.condition.ilike(f"%{condition}%"))
+    if min_price:
+        query = query.where(Listing.price >= min_price)
+    if max_price:
+        query = query.where(Listing.price <= max_price)
+    if location:
+        query = query.where(Listing.location.ilike(f"%{location}%"))
+
+    return query.offset(skip).limit(limit)
+
+def columns(query):
+    # Same statement, but yielding plain Row tuples of the listing columns
+    # rather than ORM instances (no identity map, no change tracking)
+    return query.with_only_columns(*Listing.__table__.columns)
+
+def versioned_update(model, row_id: int, version: int, user: User, values: dict):
+    # Compare-and-set in one statement: applies only if the row is still at
+    # `version` and belongs to `user` (admins may edit any row), and returns
+    # the updated row. No row back means missing, forbidden or stale.
+    query = update(model).where(model.id == row_id, model.version == version)
+    if user.role != UserRole.ADMIN:
+        query = query.where(model.seller_id == user.id)
+    return query.values(**values, version=model.version + 1).returning(model)
+
+def listings_by_seller(seller_id: int):
+    return select(Listing).where(Listing.seller_id == seller_id)
+
+def buy_request_by_id(request_id: int):
+    return select(BuyRequest).where(BuyRequest.id == request_id)
+
+def buy_requests_for(
+    user: User,
+    status: Optional[BuyRequestStatus] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    cursor: Optional[int] = None,
+    limit: int = 50,
+):
+    # Keyset pagination, newest first: `cursor` is the last id of the previous
+    # page. One extra row is fetched so the caller can tell whether there is a
+    # next page (see page()).
+    query = select(BuyRequest).options(
+        selectinload(BuyRequest.listing), selectinload(BuyRequest.buyer)
+    )
+    if user.role == UserRole.SELLER:
+        query = query.where(BuyRequest.seller_id == user.id)
+    elif user.role != UserRole.ADMIN:
+        query = query.where(BuyRequest.buyer_id == user.id)
+
+    if status:
+        query = query.where(BuyRequest.status == status)
+    if created_after:
+        query = query.where(BuyRequest.created_at >= created_after)
+    if created_before:
+        query = query.where(BuyRequest.created_at < created_before)
+    if cursor:
+        query = query.where(BuyRequest.id < cursor)
+
+    return query.order_by(BuyRequest.id.desc()).limit(limit + 1)
+
+def page(rows, limit: int):
+    """Split a limit + 1 result into (rows, next cursor or None)."""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, rows[-1].id
+    return rows, None
+
+def admin_stats():
+    # One pass per table: FILTER'd aggregates instead of a count(*) subquery
+    # per figure
+    return (
+        select(
+            func.count().label("total_listings"),
+            func.count().filter(Listing.status == ListingStatus.ACTIVE).label("active_listings"),
+        ),
+        select(
+            func.count().label("total_requests"),
+            func.count().filter(
+                BuyRequest.status == BuyRequestStatus.COMPLETED,
+                BuyRequest.commission_status == "pending"
+            ).label("pending_commissions"),
+        ),
+    )
@@ -0,0 +1,92 @@
+import logging
+import sqlite3
+import threading
+import time
+from fastapi import HTTPException, Request
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Token buckets keyed by (scope, client address). The buckets live in a small
+# SQLite file shared by every worker process (see serve.py), and each check is
+# a single upsert, so a limit holds no matter which worker gets the request.
+# Counters are disposable: the file is unsynced, and if it is locked for too
+# long the request is let through rather than failed.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL,
+    allowed INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+# Refill by elapsed time (capped at the burst size), then take one token if
+# there is one. `allowed` records whether this call got it.
+TAKE = """
+INSERT INTO buckets (key, tokens, updated, allowed) VALUES (:key, :burst - 1, :now, 1)
+ON CONFLICT (key) DO UPDATE SET
+    allowed = min(:burst, tokens + (:now - updated) * :rate) >= 1,
+    tokens = min(:burst, tokens + (:now - updated) * :rate)
+             - (min(:burst, tokens + (:now - updated) * :rate) >= 1),
+    updated = :now
+RETURNING tokens, allowed
+"""
+
+PRUNE_EVERY = 1000
+IDLE_SECONDS = 3600
+
+class RateLimiter:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = None
+        self.calls = 0
+
+    def connect(self):
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=0.05)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=OFF")
+            self.conn.executescript(SCHEMA)
+        return self.conn
+
+    def take(self, key: str, rate: float, burst: int):
+        """Take a token from `key`'s bucket; returns seconds to wait, 0 if allowed."""
+        now = time.time()
+        try:
+            with self.lock:
+                conn = self.connect()
+                tokens, allowed = conn.execute(
+                    TAKE, {"key": key, "burst": burst, "rate": rate, "now": now}
+                ).fetchone()
+                self.calls += 1
+                if self.calls % PRUNE_EVERY == 0:
+                    conn.execute("DELETE FROM buckets WHERE updated < ?", (now - IDLE_SECONDS,))
+        except sqlite3.OperationalError:
+            logger.warning("Rate limiter unavailable, letting request through", exc_info=True)
+            return 0
+        return 0 if allowed else (1 - tokens) / rate
+
+limiter = RateLimiter(settings.RATE_LIMIT_DATABASE)
+
+def rate_limit(scope: str, per_minute: int, burst: int):
+    """Dependency that answers 429 once a client has spent its `scope` bucket."""
+    rate = per_minute / 60
+
+    def check(request: Request):
+        if per_minute <= 0:
+            return
+        client = request.client.host if request.client else "unknown"
+        wait = limiter.take(f"{scope}:{client}", rate, burst)
+        if wait:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": str(max(1, round(wait)))},
+            )
+    return check
+
+auth_limit = rate_limit("auth", settings.AUTH_RATE_PER_MINUTE, settings.AUTH_BURST)
+api_limit = rate_limit("api", settings.API_RATE_PER_MINUTE, settings.API_BURST)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, TypeAdapter
 from typing import Optional, List
 from datetime import datetime
 from models import UserRole, ListingStatus, BuyRequestStatus
@@ -52,6 +52,9 @@ class ListingUpdate(BaseModel):
     description: Optional[str] = None
     photos: Optional[List[str]] = None
     status: Optional[ListingStatus] = None
+    # The version the client last saw; the update is refused (409) if the
+    # listing has changed since
+    version: Optional[int] = None
 
 class ListingResponse(BaseModel):
     id: int
@@ -68,6 +71,7 @@ class ListingResponse(BaseModel):
     status: ListingStatus
     created_at: datetime
     updated_at: datetime
+    version: int
     
     class Config:
         from_attributes = True
@@ -78,6 +82,7 @@ class BuyRequestCreate(BaseModel):
 class BuyRequestUpdate(BaseModel):
     status: BuyRequestStatus
     commission_status: Optional[str] = None
+    version: Optional[int] = None
 
 class BuyRequestResponse(BaseModel):
     id: int
@@ -88,6 +93,20 @@ class BuyRequestResponse(BaseModel):
     commission_status: str
     created_at: datetime
     updated_at: datetime
+    version: int
     
     class Config:
         from_attributes = True
+
+class BuyRequestDetail(BuyRequestResponse):
+    listing: Optional[ListingResponse] = None
+    buyer: Optional[UserResponse] = None
+
+# List endpoints hand these plain Row tuples from a column-only select (see
+# queries.columns) and return the bytes directly, so each row is validated
+# once and encoded by pydantic-core instead of going through FastAPI's
+# response_model validation and jsonable_encoder.
+listing_list = TypeAdapter(List[ListingResponse])
+
+def dump_listings(rows) -> bytes:
+    return listing_list.dump_json(listing_list.validate_python(rows, from_attributes=True))
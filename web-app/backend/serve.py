@@ -0,0 +1,39 @@
+"""Production entry point: run the API in several worker processes.
+
+uvicorn's supervisor binds the socket once and forks WORKERS processes that
+share it, restarting any that die. Rate-limit buckets and background jobs are
+kept in SQLite files, so they stay consistent across workers. Pending schema
+migrations are applied before the workers start.
+
+    python serve.py --workers 4 --port 8000
+"""
+import argparse
+import os
+
+import uvicorn
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1)))
+    parser.add_argument("--forwarded-allow-ips", default=os.environ.get("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+                        help="proxies trusted to set X-Forwarded-For (the rate limiter keys on client address)")
+    args = parser.parse_args()
+
+    # Migrate once up front, not in every worker
+    from migrate import migrate
+    migrate()
+
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        proxy_headers=True,
+        forwarded_allow_ips=args.forwarded_allow_ips,
+        access_log=False,
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+from fastapi import HTTPException
+from datetime import timedelta
+from typing import Optional
+
+from models import User, Listing, BuyRequest, OutboxJob, UserRole, ListingStatus
+from schemas import UserCreate, BuyRequestCreate
+from auth import create_access_token
+from config import settings
+
+# Request rules shared by the sync handlers (main.py) and the async ones
+# (async_api.py). Handlers only do their own IO, awaited or not, around these
+# plain functions, so the two paths can't drift apart on who may do what.
+
+def check_unregistered(existing: Optional[User]):
+    if existing:
+        raise HTTPException(status_code=400, detail="Email or phone already registered")
+
+def new_user(user: UserCreate, hashed_password: str) -> User:
+    return User(
+        name=user.name,
+        email_or_phone=user.email_or_phone,
+        hashed_password=hashed_password,
+        role=user.role,
+        location=user.location
+    )
+
+def check_login(user: Optional[User], password_ok: bool):
+    if not user or not password_ok:
+        raise HTTPException(status_code=401, detail="Incorrect credentials")
+
+def token_response(user: User) -> dict:
+    access_token = create_access_token(
+        data={"sub": str(user.id)},
+        expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    return {"access_token": access_token, "token_type": "bearer", "user": user}
+
+def check_found(obj, name: str):
+    if obj is None:
+        raise HTTPException(status_code=404, detail=f"{name} not found")
+
+def check_owner(obj, user: User, name: str):
+    """404 if `obj` is missing, 403 unless `user` is its seller or an admin"""
+    check_found(obj, name)
+    if obj.seller_id != user.id and user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+def split_update(update) -> tuple:
+    """(changes, version) from a ListingUpdate/BuyRequestUpdate"""
+    changes = update.dict(exclude_unset=True)
+    return changes, changes.pop("version", None)
+
+def versioned_response(row, schema):
+    # The versioned fast path's RETURNING row, validated into its response
+    # model before the commit expires it; None if the UPDATE matched nothing
+    return schema.model_validate(row) if row is not None else None
+
+def resolve_versioned(obj, user: User, version: Optional[int], changes: dict, name: str):
+    """Apply `changes` to a loaded `obj`, once the fast path (if any) missed.
+
+    With a version, the fast path only misses for a missing, forbidden or
+    stale row, so after the 404/403 checks it's a 409."""
+    check_owner(obj, user, name)
+    if version is not None:
+        raise HTTPException(status_code=409, detail=f"{name} has changed, reload and retry")
+    for key, value in changes.items():
+        setattr(obj, key, value)
+
+def new_buy_request(request: BuyRequestCreate, listing: Optional[Listing], user: User) -> BuyRequest:
+    check_found(listing, "Listing")
+    if listing.status != ListingStatus.ACTIVE:
+        raise HTTPException(status_code=400, detail="Listing is not active")
+    return BuyRequest(
+        listing_id=request.listing_id,
+        buyer_id=user.id,
+        seller_id=listing.seller_id
+    )
+
+def queue_commission(db, request_id: int, commission_status: Optional[str]):
+    # Goes to the outbox in the update's own transaction; jobs.py relays it to
+    # the job queue once committed, and a rolled-back update takes it along
+    if commission_status is not None:
+        db.add(OutboxJob(kind="commission.record", payload={
+            "request_id": request_id, "commission_status": commission_status,
+        }))
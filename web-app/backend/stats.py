@@ -0,0 +1,45 @@
+import asyncio
+import logging
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from config import settings
+import database
+import queries
+
+logger = logging.getLogger(__name__)
+
+# Latest admin stats when ADMIN_STATS_REFRESH_SECONDS is set; handlers fall
+# back to a live query until the first refresh lands.
+snapshot = None
+
+def compute_admin_stats(db: Session):
+    stats = {}
+    for query in queries.admin_stats():
+        stats.update(db.execute(query).one()._asdict())
+    return stats
+
+async def compute_admin_stats_async(db):
+    stats = {}
+    for query in queries.admin_stats():
+        stats.update((await db.execute(query)).one()._asdict())
+    return stats
+
+def refresh_sync():
+    with database.SessionLocal() as db:
+        return compute_admin_stats(db)
+
+async def refresh():
+    if settings.ASYNC_DATABASE:
+        async with database.AsyncSessionLocal() as db:
+            return await compute_admin_stats_async(db)
+    return await run_in_threadpool(refresh_sync)
+
+async def refresh_loop(interval: int):
+    global snapshot
+    while True:
+        try:
+            snapshot = await refresh()
+        except Exception:
+            logger.exception("Admin stats refresh failed")
+        await asyncio.sleep(interval)
@@ -0,0 +1,80 @@
+"""Concurrent-write stress check for the SQLite profile.
+
+Runs N clients at once, each registering a seller and immediately creating a
+listing, against a fresh SQLite database, then fails if any request errored
+or the server logged "database is locked". HTTP error responses and
+transport errors (the connection failing under the request) are counted
+apart, since only the former come from the app.
+
+    python stress_sqlite.py --clients 64 [--async] [--single-writer]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+
+import httpx
+
+from bench_async import start_server, wait_ready
+
+async def client_run(client, i):
+    """None, or ("http" | "transport", message) for the first failed request"""
+    step = "register"
+    try:
+        r = await client.post("/api/auth/register", json={
+            "name": f"seller{i}", "email_or_phone": f"seller{i}@stress", "password": "stress", "role": "seller",
+        })
+        if r.status_code != 200:
+            return "http", f"register {i}: {r.status_code} {r.text}"
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+        step = "listing"
+        r = await client.post("/api/listings", headers=headers, json={
+            "category": "Laptop", "brand": "Dell", "model": f"XPS {i}",
+            "condition": "broken", "price": 100 + i, "location": "Pune", "photos": [],
+        })
+        if r.status_code != 200:
+            return "http", f"listing {i}: {r.status_code} {r.text}"
+    except httpx.TransportError as e:
+        return "transport", f"{step} {i}: {type(e).__name__} {e}"
+
+async def stress(args):
+    with tempfile.TemporaryDirectory() as tmp, open(os.path.join(tmp, "server.log"), "w+") as log:
+        env = {"SQLITE_SINGLE_WRITER": "true" if args.single_writer else "false"}
+        mode = "async" if args.use_async else "sync"
+        server = start_server(mode, args.port, os.path.join(tmp, "stress.db"), stderr=log, **env)
+        try:
+            # No keep-alive: requests queued behind slow writes could otherwise
+            # pick up a pooled connection just as uvicorn's keep-alive timeout
+            # (5 s) closes it, and fail with ReadError
+            limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=0)
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=120) as client:
+                await wait_ready(client)
+                errors = [e for e in await asyncio.gather(*(client_run(client, i) for i in range(args.clients))) if e]
+                listings = (await client.get("/api/listings", params={"limit": args.clients})).json()
+        finally:
+            server.terminate()
+            server.wait()
+        log.seek(0)
+        locked = log.read().count("database is locked")
+
+    failed = [message for kind, message in errors if kind == "http"]
+    transport = [message for kind, message in errors if kind == "transport"]
+    print(f"{mode} single_writer={args.single_writer}: {args.clients} clients, "
+          f"{len(listings)} listings, {len(failed)} failed requests, {len(transport)} transport errors, "
+          f"{locked} lock errors")
+    for e in (failed + transport)[:10]:
+        print("  " + e)
+    return not errors and not locked and len(listings) == args.clients
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--async", dest="use_async", action="store_true")
+    parser.add_argument("--single-writer", action="store_true")
+    parser.add_argument("--port", type=int, default=8775)
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(stress(args)) else 1)
+
+if __name__ == "__main__":
+    main()